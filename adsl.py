@@ -24,6 +24,8 @@
 
 
 from twx.botapi import TelegramBot
+import heapq
+import queue
 import threading
 import time
 import os
@@ -31,14 +33,99 @@ import datetime
 
 
 import config
-
-
-class Monitor(threading.Thread):
-
-    def __init__(self, ser):
-        threading.Thread.__init__(self)
-
+import metrics
+
+
+MAXIMUM_STATES = {
+    'FSM_OISIF': (10800, '3 hours'),
+    'FSM_OPEN1': (120, '2 minutes'),
+    'FSM_OPEN2': (120, '2 minutes'),
+    'FSM_LETTRE': (120, '2 minutes'),
+    'FSM_ECOUTE': (120, '2 minutes'),
+    'FSM_ATTENTE': (120, '2 minutes'),
+    'FSM_QSO': (1800, '30 minutes'),
+    'FSM_ANTI_BAVARD': (120, '2 minutes'),
+    'FSM_BLOQUE': (120, '2 minutes'),
+    'FSM_TEXTE_73': (120, '2 minutes'),
+    'FSM_TEXTE_HB9G': (120, '2 minutes'),
+    'FSM_TEXTE_LONG': (120, '2 minutes'),
+    'FSM_BALISE_LONGUE': (120, '2 minutes'),
+    'FSM_BALISE_STATS1' : (120, '2 minutes'),
+    'FSM_BALISE_STATS2' : (120, '2 minutes'),
+    'FSM_BALISE_STATS3' : (120, '2 minutes'),
+    'FSM_BALISE_SPECIALE': (120, '2 minutes'),
+    'FSM_BALISE_SPECIALE_STATS1' : (120, '2 minutes'),
+    'FSM_BALISE_SPECIALE_STATS2' : (120, '2 minutes'),
+    'FSM_BALISE_SPECIALE_STATS3' : (120, '2 minutes'),
+    'FSM_BALISE_COURTE': (120, '2 minutes'),
+    'FSM_BALISE_COURTE_OPEN': (120, '2 minutes'),
+}
+
+
+class Deadlines:
+    """Alarms that fire at a given time unless they are re-armed or disarmed
+    before. Re-arming does not look for the previous entry in the heap, stale
+    entries are skipped when they reach the top instead."""
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+
+    def arm(self, key, delay, message):
+        at = time.monotonic() + delay
+        self._deadlines[key] = (at, message)
+        heapq.heappush(self._heap, (at, key))
+
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(at, key) for key, (at, _) in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def disarm(self, key):
+        self._deadlines.pop(key, None)
+
+    def clear(self):
+        self._heap = []
+        self._deadlines = {}
+
+    def snapshot(self):
+        """Return the armed deadlines as {key: (wall clock time, message)}"""
+        offset = time.time() - time.monotonic()
+        return {key: (at + offset, message) for key, (at, message) in self._deadlines.items()}
+
+    def _drop_stale(self):
+        while self._heap:
+            at, key = self._heap[0]
+            if key in self._deadlines and self._deadlines[key][0] == at:
+                return
+            heapq.heappop(self._heap)
+
+    def timeout(self):
+        """Seconds until the next deadline, or None if nothing is armed"""
+        self._drop_stale()
+        if not self._heap:
+            return None
+        return max(0, self._heap[0][0] - time.monotonic())
+
+    def pop_expired(self):
+        expired = []
+        now = time.monotonic()
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, key = heapq.heappop(self._heap)
+            expired.append((key, self._deadlines.pop(key)[1]))
+            self._drop_stale()
+        return expired
+
+
+class Monitor:
+    """State and alarms of one source, updated by Monitors"""
+
+    def __init__(self, ser, alarms_changed):
         self.ser = ser
+        self._lock = threading.Lock()
+        self.deadlines = Deadlines()
+        # Set whenever the result of alarms() may have changed
+        self.alarms_changed = alarms_changed
         self.reset_states()
 
     def reset_states(self):
@@ -49,190 +136,416 @@ class Monitor(threading.Thread):
         self.last_gps_balise = None
         self.last_message = None
         self.last_balise = None
+        self.deadlines.clear()
+        self.active_alarms = {}
+        # Auto-acked alarms, only the latest of each kind is kept until
+        # alarms() returns it
         self.reseted = False
         self.hoho_message = None
 
-    def run(self):
+    def snapshot(self):
+        """Return the state to save across restarts (see snapshot.py)"""
+
+        def timestamp(d):
+            return None if d is None else d.timestamp()
+
+        with self._lock:
+            return {
+                "current_state": self.current_state,
+                "status_starttime": {state: d.timestamp() for state, d in self.status_starttime.items()},
+                "status_duration": {state: d.total_seconds() for state, d in self.status_duration.items()},
+                "last_gps_balise": timestamp(self.last_gps_balise),
+                "last_message": timestamp(self.last_message),
+                "last_balise": timestamp(self.last_balise),
+                "deadlines": self.deadlines.snapshot(),
+                "active_alarms": dict(self.active_alarms),
+            }
+
+    def restore(self, state):
+        """Restore a state returned by snapshot(). The deadlines that passed
+        in the meantime fire at once."""
+
+        def datetime_from(ts):
+            return None if ts is None else datetime.datetime.fromtimestamp(ts)
+
+        with self._lock:
+            self.current_state = state["current_state"]
+            self.status_starttime = {s: datetime.datetime.fromtimestamp(ts) for s, ts in state["status_starttime"].items()}
+            self.status_duration = {s: datetime.timedelta(seconds=d) for s, d in state["status_duration"].items()}
+            self.last_gps_balise = datetime_from(state["last_gps_balise"])
+            self.last_message = datetime_from(state["last_message"])
+            self.last_balise = datetime_from(state["last_balise"])
+
+            now = time.time()
+            for key, (at, message) in state["deadlines"].items():
+                self.deadlines.arm(key, max(0, at - now), message)
+            self.active_alarms = dict(state["active_alarms"])
+
+        self.alarms_changed.set()
+
+    def update(self, lines):
+
+        with self._lock:
+            for line in lines:
+                self.process_line(line.strip())
+
+            for key, message in self.deadlines.pop_expired():
+                self.active_alarms[key] = message
+                self.alarms_changed.set()
+
+    def _rearm(self, key, delay, message):
+        self.deadlines.arm(key, delay, message)
+        if self.active_alarms.pop(key, None) is not None:
+            self.alarms_changed.set()
+
+    def process_line(self, line):
+
+        if line.endswith("common init"):
+            self.reset_states()
+            self.reseted = True
+            self.alarms_changed.set()
+
+        self.last_message = datetime.datetime.now()
+        self._rearm('uart', 300, "No message on UART for more than 5 minutes !")
+
+        if "[HOHO]" in line:
+            self.hoho_message = line
+            self.alarms_changed.set()
+
+        if "T_GPS" in line:
+            self.last_gps_balise = datetime.datetime.now()
+            self._rearm('gps', 300, "No GPS for more than 5 minutes !")
+
+        if "FSM: FSM_" in line:
+            new_state = line.split(' ')[-1]
+
+            if self.current_state:
+                self.status_duration[self.current_state] = datetime.datetime.now() - self.status_starttime[self.current_state]
+
+            self.status_starttime[new_state] = datetime.datetime.now()
+            self.current_state = new_state
+
+            if new_state in MAXIMUM_STATES:
+                delay, text = MAXIMUM_STATES[new_state]
+                self._rearm('state', delay, "The FSM has been in the state {} for more than {} !".format(new_state, text))
+            else:
+                self.deadlines.disarm('state')
+                if self.active_alarms.pop('state', None) is not None:
+                    self.alarms_changed.set()
+
+        if "FSM: FSM_BALISE_LONGUE" in line or \
+                "FSM: FSM_BALISE_SPECIALE" in line or \
+                "FSM: FSM_BALISE_STATS1" in line or \
+                "FSM: FSM_BALISE_SPECIALE_STATS1" in line:
+            self.last_balise = datetime.datetime.now()
+            self._rearm('balise', 10800, "No long balise for more than 3 hours !")
 
-        queue = self.ser.register_client()
+    def alarms(self):
+        """Return the current alarms. The auto-acked ones are only returned
+        once, and alarms_changed is set again so that the next check sees
+        them gone."""
 
-        while True:
+        with self._lock:
+            result = []
+
+            if self.reseted:
+                result.append("(AutoAckedError) A reset occured !")
+                self.reseted = False
 
-            try:
-                line = queue.popleft()
-            except IndexError:
-                time.sleep(1)
-                line = None
+            if self.hoho_message:
+                result.append("(AutoAckedError) An error message was found in the UART: {}".format(self.hoho_message))
+                self.hoho_message = None
 
-            if line:
-                line = line.strip()
+            if result:
+                self.alarms_changed.set()
 
-                self.last_message = datetime.datetime.now()
+            return result + list(self.active_alarms.values())
 
-                if line.endswith("common init"):
-                    self.reset_states()
-                    self.reseted = True
 
-                if "[HOHO]" in line:
-                    self.hoho_message = line
+class Monitors(threading.Thread):
+    """Run the Monitor of every source in a single thread, woken up by the
+    lines of any source or by the first deadline"""
 
-                if "T_GPS" in line:
-                    self.last_gps_balise = datetime.datetime.now()
+    def __init__(self, sers):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.alarms_changed = threading.Event()
+        self.monitors = {name: Monitor(ser, self.alarms_changed) for name, ser in sers.items()}
+        self._wakeup = threading.Event()
 
-                if "FSM: FSM_" in line:
-                    new_state = line.split(' ')[-1]
+    def run(self):
 
-                    if self.current_state:
-                        self.status_duration[self.current_state] = datetime.datetime.now() - self.status_starttime[self.current_state]
+        clients = [(monitor, monitor.ser.register_client(wakeup=self._wakeup, kind="monitor")) for monitor in self.monitors.values()]
 
-                    self.status_starttime[new_state] = datetime.datetime.now()
-                    self.current_state = new_state
+        while True:
+            timeouts = [t for t in (monitor.deadlines.timeout() for monitor, _ in clients) if t is not None]
+            self._wakeup.wait(min(timeouts) if timeouts else None)
+            self._wakeup.clear()
 
-                if "FSM: FSM_BALISE_LONGUE" in line or \
-                        "FSM: FSM_BALISE_SPECIALE" in line or \
-                        "FSM: FSM_BALISE_STATS1" in line or \
-                        "FSM: FSM_BALISE_SPECIALE_STATS1" in line:
-                    self.last_balise = datetime.datetime.now()
+            for monitor, client in clients:
+                lines, _, _ = client.drain()
+                monitor.update(lines)
 
     def alarms(self):
+        """Return the current alarms of all the sources, prefixed by the name
+        of the source if there are several"""
+
+        if len(self.monitors) == 1:
+            return next(iter(self.monitors.values())).alarms()
+
+        return ["[{}] {}".format(name, alarm) for name, monitor in self.monitors.items() for alarm in monitor.alarms()]
+
+
+telegram_send_time = metrics.Histogram("glutte_telegram_send_seconds", "Time to send a Telegram message",
+                                       (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+# Longest text accepted by sendMessage
+MAX_MESSAGE_LENGTH = 4096
+
+def split_messages(texts, separator="\n\n", limit=MAX_MESSAGE_LENGTH):
+    """Join the texts into as few messages of at most limit characters as
+    possible. Longer texts are split at the end of a line."""
+    parts = []
+    for text in texts:
+        while len(text) > limit:
+            cut = text.rfind("\n", 0, limit)
+            if cut <= 0:
+                cut = limit
+            parts.append(text[:cut])
+            text = text[cut:].lstrip("\n")
+        parts.append(text)
+
+    messages = [parts[0]]
+    for part in parts[1:]:
+        if len(messages[-1]) + len(separator) + len(part) <= limit:
+            messages[-1] += separator + part
+        else:
+            messages.append(part)
+    return messages
+
+
+class Outbox:
+    """Queue of the messages to send to the Telegram group.
+
+    Coalescable messages (the alarm notifications) queued within
+    COALESCE_DELAY of each other are sent as a single message, or as few
+    as the Telegram length limit allows, and messages are never sent less
+    than MIN_INTERVAL apart."""
+
+    COALESCE_DELAY = 2
+    MIN_INTERVAL = 3
+
+    def __init__(self, bot, chat_id):
+        self._bot = bot
+        self._chat_id = chat_id
+        self._queue = queue.Queue()
+        self._last_send = 0
+
+    def put(self, text, coalesce=False):
+        self._queue.put((text, coalesce))
+
+    @staticmethod
+    def messages(text, queued):
+        """Return the messages to send for a text taken from the queue and
+        the (text, coalesce) queued within COALESCE_DELAY after it, if it was
+        coalescable. Replies to commands are not merged with the alarms, and
+        go first."""
+        texts = [text]
+        replies = []
+        for text, coalesce in queued:
+            (texts if coalesce else replies).append(text)
+        return [message for reply in replies for message in split_messages([reply])] + split_messages(texts)
+
+    def run(self):
+        while True:
+            text, coalesce = self._queue.get()
+
+            queued = []
+            if coalesce:
+                deadline = time.monotonic() + self.COALESCE_DELAY
+                while True:
+                    try:
+                        queued.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+
+            for message in self.messages(text, queued):
+                self._send(message)
 
-        MAXIMUM_STATES = {
-            'FSM_OISIF': (10800, '3 hours'),
-            'FSM_OPEN1': (120, '2 minutes'),
-            'FSM_OPEN2': (120, '2 minutes'),
-            'FSM_LETTRE': (120, '2 minutes'),
-            'FSM_ECOUTE': (120, '2 minutes'),
-            'FSM_ATTENTE': (120, '2 minutes'),
-            'FSM_QSO': (1800, '30 minutes'),
-            'FSM_ANTI_BAVARD': (120, '2 minutes'),
-            'FSM_BLOQUE': (120, '2 minutes'),
-            'FSM_TEXTE_73': (120, '2 minutes'),
-            'FSM_TEXTE_HB9G': (120, '2 minutes'),
-            'FSM_TEXTE_LONG': (120, '2 minutes'),
-            'FSM_BALISE_LONGUE': (120, '2 minutes'),
-            'FSM_BALISE_STATS1' : (120, '2 minutes'),
-            'FSM_BALISE_STATS2' : (120, '2 minutes'),
-            'FSM_BALISE_STATS3' : (120, '2 minutes'),
-            'FSM_BALISE_SPECIALE': (120, '2 minutes'),
-            'FSM_BALISE_SPECIALE_STATS1' : (120, '2 minutes'),
-            'FSM_BALISE_SPECIALE_STATS2' : (120, '2 minutes'),
-            'FSM_BALISE_SPECIALE_STATS3' : (120, '2 minutes'),
-            'FSM_BALISE_COURTE': (120, '2 minutes'),
-            'FSM_BALISE_COURTE_OPEN': (120, '2 minutes'),
-        }
-
-        result = []
-
-        if self.reseted:
-            result.append("(AutoAckedError) A reset occured !")
-            self.reseted = False
-
-        if self.hoho_message:
-            result.append("(AutoAckedError) An error message was found in the UART: {}".format(self.hoho_message))
-            self.hoho_message = None
-
-        if self.last_message and (datetime.datetime.now() - self.last_message).total_seconds() > 300:
-            result.append("No message on UART for more than 5 minutes !")
-
-        if self.last_gps_balise and (datetime.datetime.now() - self.last_gps_balise).total_seconds() > 300:
-            result.append("No GPS for more than 5 minutes !")
-
-        if self.last_balise and (datetime.datetime.now() - self.last_balise).total_seconds() > 10800:
-            result.append("No long balise for more than 3 hours !")
-
-        if self.current_state and self.current_state in MAXIMUM_STATES and (datetime.datetime.now() - self.status_starttime[self.current_state]).total_seconds() > MAXIMUM_STATES[self.current_state][0]:
-            result.append("The FSM has been in the state {} for more than {} !".format(self.current_state, MAXIMUM_STATES[self.current_state][1]))
-
-        return result
+    def _delay(self):
+        """Time to wait before the next message"""
+        return self._last_send + self.MIN_INTERVAL - time.monotonic()
+
+    def _sent(self, t_start):
+        self._last_send = time.monotonic()
+        telegram_send_time.observe(self._last_send - t_start)
+
+    def _send(self, text):
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        t_start = time.monotonic()
+        try:
+            self._bot.send_message(self._chat_id, text).wait()
+        except Exception as e:
+            print("Could not send Telegram message: {}".format(e))
+        self._sent(t_start)
 
 
 class ADSL(threading.Thread):
+    """Telegram bot reporting the alarms of the Monitors and answering the
+    /status, /stats and /reboot commands. Commands, alarms and the sending
+    of the messages each run in their own thread. The bot can be given to
+    run against a stand-in for the Telegram API (see botstub.py).
 
-    def __init__(self, ser):
+    sers is a dict of the SerialRX of the sources by name."""
+
+    def __init__(self, sers, bot=None):
         threading.Thread.__init__(self)
-        self.monitor = Monitor(ser)
-        self._ser = ser
+        self.monitors = Monitors(sers)
+        self._sers = sers
+        self._bot = bot
+        self.outbox = None
+        # Alarms already notified to the group
+        self.notified_alarms = []
+        # Time of the snapshot the state was restored from, if any
+        self.restored = None
 
     def run(self):
 
-        self.monitor.start()
+        self.monitors.start()
 
-        alarms = []
+        if self._bot is None:
+            if not config.TELEGRAM_API_TOKEN or not config.TELEGRAM_GROUP:
+                print("Telegram not configured, ADSL not running.")
+                return
 
-        if not config.TELEGRAM_API_TOKEN or not config.TELEGRAM_GROUP:
-            print("Telegram not configured, ADSL not running.")
-            return
+            self._bot = TelegramBot(config.TELEGRAM_API_TOKEN)
 
-        bot = TelegramBot(config.TELEGRAM_API_TOKEN)
+        bot = self._bot
         bot.update_bot_info().wait()
         print("Telegram bot {} ready".format(bot.username))
 
-        offset = None
+        self.outbox = Outbox(bot, config.TELEGRAM_GROUP)
+        threading.Thread(target=self.outbox.run, daemon=True).start()
+        threading.Thread(target=self._handle_commands, daemon=True).start()
+
+        if self.restored is None:
+            self.outbox.put(b'\xe2\x84\xb9 Hello ! I have been started, so everything has been reset on my side.'.decode())
+        else:
+            self.outbox.put(b'\xe2\x84\xb9 Hello ! I have been restarted, and restored my state from {} seconds before.'.decode().format(int(time.time() - self.restored)))
 
-        bot.send_message(config.TELEGRAM_GROUP, b'\xe2\x84\xb9 Hello ! I have been started, so everything has been reset on my side.'.decode()).wait()
+        self._notify_alarms()
+
+    def _notify_alarms(self):
+
+        while True:
+            self.monitors.alarms_changed.wait()
+            self.monitors.alarms_changed.clear()
+            self.check_alarms()
+
+    def check_alarms(self):
+        """Notify the alarms that appeared or disappeared since the last call"""
+
+        alarms = self.notified_alarms
+        new_alarms = self.monitors.alarms()
+
+        for alarm in new_alarms:
+            if alarm not in alarms:
+                self.outbox.put(b'\xe2\x9a\xa0 Problem \xe2\x9a\xa0\nSorry to bother you, but I think there is a problem with the glutt-o-matique: \n\n{}'.decode().format(alarm), coalesce=True)
+
+        for old_alarm in alarms:
+            if old_alarm not in new_alarms:
+                self.outbox.put(b'\xe2\x9c\x85 Problem fixed \xe2\x9c\x85\nThe following problem is not anymore a problem with the glutt-o-matique:\n\n{}'.decode().format(old_alarm), coalesce=True)
+
+        self.notified_alarms = new_alarms
+
+    def _handle_commands(self):
+
+        offset = None
 
         while True:
 
-            updates = bot.get_updates(offset=offset, limit=1, timeout=15).wait()
+            updates = self._bot.get_updates(offset=offset, limit=1, timeout=15).wait()
             if updates:
                 offset = updates[0].update_id + 1
 
                 try:
                     if int(updates[0].message.chat.id) == int(config.TELEGRAM_GROUP):
-                        if updates[0].message.text.startswith('/status'):
-                            response = "Here is the current status:\n\n"
+                        self.handle_command(updates[0].message.text)
+                    else:
+                        print(f"Ignore chat ID {updates[0].message.chat.id}")
+                except:
+                    pass
 
-                            response += "Current state: {}\n".format(self.monitor.current_state)
-                            if self.monitor.last_message:
-                                response += "Last message: {} ({} seconds ago)\n".format(self.monitor.last_message.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - self.monitor.last_message).total_seconds()))
-                            if self.monitor.last_gps_balise:
-                                response += "Last GPS: {} ({} seconds ago)\n".format(self.monitor.last_gps_balise.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - self.monitor.last_gps_balise).total_seconds()))
-                            if self.monitor.last_balise:
-                                response += "Last Balise: {} ({} seconds ago)\n".format(self.monitor.last_balise.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - self.monitor.last_balise).total_seconds()))
+    def handle_command(self, text):
 
-                            response += "\n"
+        if text.startswith('/status'):
+            self.outbox.put(self.status_message())
 
-                            for state, starttime in self.monitor.status_starttime.items():
-                                response += "{}: Started on {} ({} seconds ago)".format(state, starttime.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - starttime).total_seconds()))
+        elif text.startswith('/stats'):
+            t_now = time.time()
 
-                                if state == self.monitor.current_state:
-                                    response += ", in progress\n"
-                                else:
-                                    response += ", duration: {} seconds\n".format(int(self.monitor.status_duration[state].total_seconds()))
+            stats_lines = ["Stats:"]
 
-                            bot.send_message(config.TELEGRAM_GROUP, response).wait()
+            for name, ser in self._sers.items():
+                if len(self._sers) > 1:
+                    stats_lines.append(f"\n{name}:")
 
-                        elif updates[0].message.text.startswith('/stats'):
-                            t_now = time.time()
-                            values = ser.get_parsed_values()
+                values = ser.get_parsed_values()
+                for k in values:
+                    value, ts, timeout = values[k]
+                    since = t_now - ts
+                    stats_lines.append(f"{k}: {value} since {since}s")
+            self.outbox.put("\n".join(stats_lines))
 
-                            stats_lines = ["Stats:"]
+        elif text.startswith('/reboot'):
+            os.system(config.TELEGRAM_REBOOT_COMMAND)
+            self.outbox.put(b'\xe2\x84\xb9 I issued a reboot command. I hope everything is ok.'.decode())
 
-                            for k in values:
-                                value, ts = values[k]
-                                since = t_now - ts
-                                stats_lines.append(f"{k}: {value} since {since}s")
-                            bot.send_message(config.TELEGRAM_GROUP, "\n".join(stats_lines)).wait()
+    def status_message(self):
 
+        response = "Here is the current status:\n\n"
 
-                        elif updates[0].message.text.startswith('/reboot'):
-                            os.system(config.TELEGRAM_REBOOT_COMMAND)
-                            bot.send_message(config.TELEGRAM_GROUP, b'\xe2\x84\xb9 I issued a reboot command. I hope everything is ok.'.decode()).wait()
-                    else:
-                        print(f"Ignore chat ID {updates[0].message.chat.id}")
-                except:
-                    pass
+        for name, monitor in self.monitors.monitors.items():
+            if len(self.monitors.monitors) > 1:
+                response += "== {} ==\n".format(name)
+            response += self._source_status(monitor) + "\n"
+
+        return response
+
+    def _source_status(self, monitor):
+
+        response = ""
+
+        response += "Current state: {}\n".format(monitor.current_state)
+        if monitor.last_message:
+            response += "Last message: {} ({} seconds ago)\n".format(monitor.last_message.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - monitor.last_message).total_seconds()))
+        if monitor.last_gps_balise:
+            response += "Last GPS: {} ({} seconds ago)\n".format(monitor.last_gps_balise.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - monitor.last_gps_balise).total_seconds()))
+        if monitor.last_balise:
+            response += "Last Balise: {} ({} seconds ago)\n".format(monitor.last_balise.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - monitor.last_balise).total_seconds()))
 
-            new_alarms = self.monitor.alarms()
+        response += "\n"
 
-            for alarm in new_alarms:
-                if alarm not in alarms:
-                    bot.send_message(config.TELEGRAM_GROUP, b'\xe2\x9a\xa0 Problem \xe2\x9a\xa0\nSorry to bother you, but I think there is a problem with the glutt-o-matique: \n\n{}'.decode().format(alarm)).wait()
+        for state, starttime in list(monitor.status_starttime.items()):
+            response += "{}: Started on {} ({} seconds ago)".format(state, starttime.strftime("%H:%M:%S %d/%m/%Y"), int((datetime.datetime.now() - starttime).total_seconds()))
 
-            for old_alarm in alarms:
-                if old_alarm not in new_alarms:
-                    bot.send_message(config.TELEGRAM_GROUP, b'\xe2\x9c\x85 Problem fixed \xe2\x9c\x85\nThe following problem is not anymore a problem with the glutt-o-matique:\n\n{}'.decode().format(old_alarm)).wait()
+            if state == monitor.current_state:
+                response += ", in progress\n"
+            else:
+                response += ", duration: {} seconds\n".format(int(monitor.status_duration[state].total_seconds()))
 
-            alarms = new_alarms
+        summary = monitor.ser.get_fsm_stats().summary(time.time())
+        for length, states in summary["windows"].items():
+            response += "\nOver the last {:g} hour(s):\n".format(int(length) / 3600)
+            for state, stats in sorted(states.items()):
+                response += "{}: entered {} times".format(state, stats["entries"])
+                if stats["dwell_mean"] is not None:
+                    response += ", average duration: {} seconds".format(int(stats["dwell_mean"]))
+                response += "\n"
 
-            time.sleep(1)
+        return response
@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Benchmarks for the serial ingest path and the web server. Run with
+#   python benchmark.py [name ...]
+# to run all benchmarks or only the given ones. The server benchmarks
+# (latency, latency_aio, history) open a simulated serial port on a pty and
+# use the config.py settings for everything else.
+
+# The server runs in-process on gevent like under the gunicorn worker, which
+# needs the standard library patched before anything else is imported
+from gevent import monkey
+monkey.patch_all()
+
+import base64
+import itertools
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import gevent
+
+import config
+import serialrx
+import simulator
+from history import History
+
+SAMPLE_LINES = [line for line in serialrx.TEST_SET.split("\n") if line]
+
+re_cc_capa = re.compile(r"\[\d+\] CC: CAPA,(\d+),(\d+)")
+re_cc_vbat_plus = re.compile(r"\[\d+\] CC: VBAT\+,\d+,(\d+)")
+re_num_sv = re.compile(r"\[\d+\] T_GPS.+ (\d+) SV tracked")
+re_alim = re.compile(r"\[(\d+)\] ALIM (\d+) mV")
+re_temp = re.compile(r"\[\d+\] TEMP ([+-]?[0-9.]+)")
+re_relay = re.compile(r"\[\d+\] CC: RELAY,\d+,(On|Off),(On|Off),(On|Off)")
+re_deriv_delta = re.compile(r"\[\d+\] DERIV TS=.* Delta=(-?\d+)")
+
+
+class LegacyMessageParser:
+    """MessageParser as it was before the dispatch on tags, running every
+    regex on every line"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        self._last_timestamp = 0
+        self._last_timestamp_time = 0
+        self._last_cc_timestamp = 0
+        self._last_cc_timestamp_time = 0
+        self._last_cc_capa = 0
+        self._last_cc_capa_time = 0
+        self._last_vbat_plus = 0
+        self._last_vbat_plus_time = 0
+        self._last_num_sv = 0
+        self._last_num_sv_time = 0
+        self._last_alim = 0
+        self._last_alim_time = 0
+        self._last_temp = 0
+        self._last_temp_time = 0
+        self._last_relay = (False, False, False)
+        self._last_relay_time = 0
+        self._last_deriv_delta = 0
+        self._last_deriv_delta_time = 0
+
+    def parse_message(self, message, now=None):
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            match = re_cc_capa.search(message)
+            if match:
+                self._last_cc_timestamp = int(match.group(1))
+                self._last_cc_capa = int(match.group(2))
+                self._last_cc_timestamp_time = \
+                    self._last_cc_capa_time = now
+
+            match = re_cc_vbat_plus.search(message)
+            if match:
+                self._last_vbat_plus = int(match.group(1))
+                self._last_vbat_plus_time = now
+
+            match = re_num_sv.search(message)
+            if match:
+                self._last_num_sv = int(match.group(1))
+                self._last_num_sv_time = now
+
+            match = re_alim.search(message)
+            if match:
+                # Convert milliseconds to seconds so that we have consistent units between the two uptimes
+                self._last_timestamp = int(int(match.group(1)) / 1000)
+                self._last_alim = int(match.group(2))
+                self._last_timestamp_time = \
+                    self._last_alim_time = now
+
+            match = re_temp.search(message)
+            if match:
+                self._last_temp = float(match.group(1))
+                self._last_temp_time = now
+
+            match = re_relay.search(message)
+            if match:
+                self._last_relay = (match.group(1) == "On", match.group(2) == "On", match.group(3) == "On")
+                self._last_relay_time = now
+
+            match = re_deriv_delta.search(message)
+            if match:
+                self._last_deriv_delta = int(match.group(1))
+                self._last_deriv_delta_time = now
+
+    def get_last_data(self):
+        with self._lock:
+            return {"capa": (self._last_cc_capa, self._last_cc_capa_time, 60),
+                    "vbat_plus": (self._last_vbat_plus, self._last_vbat_plus_time, 60),
+                    "alim": (self._last_alim, self._last_alim_time, 60),
+                    "num_sv": (self._last_num_sv, self._last_num_sv_time, 60),
+                    "temp": (self._last_temp, self._last_temp_time, 60),
+                    "relay": (self._last_relay, self._last_relay_time, 60),
+                    "deriv_delta": (self._last_deriv_delta, self._last_deriv_delta_time, 3800),
+                    "cc_uptime": (self._last_cc_timestamp, self._last_cc_timestamp_time, 60),
+                    "uptime": (self._last_timestamp, self._last_timestamp_time, 60)}
+
+
+class FakeSerial:
+    """Serve a byte buffer the way pyserial would, with at most
+    `burst` bytes waiting in the driver at any time"""
+
+    def __init__(self, data, burst=4096):
+        self._data = data
+        self._pos = 0
+        self._burst = burst
+
+    @property
+    def in_waiting(self):
+        return min(self._burst, len(self._data) - self._pos)
+
+    def read(self, size=1):
+        chunk = self._data[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def exhausted(self):
+        return self._pos >= len(self._data)
+
+
+def make_stream(num_lines):
+    lines = (SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(num_lines))
+    return "".join(line + "\r\n" for line in lines).encode('ascii')
+
+
+def frame_bytewise(ser):
+    """The byte-at-a-time loop SerialRX.run used before LineFramer"""
+    count = 0
+    line_accumulator = []
+    while not ser.exhausted():
+        databyte = ser.read()
+        line_accumulator.append(databyte)
+
+        if databyte == b"\n":
+            try:
+                b"".join(line_accumulator).decode('ascii')
+                count += 1
+            except UnicodeDecodeError:
+                pass
+            line_accumulator = []
+    return count
+
+
+def frame_chunked(ser):
+    count = 0
+    framer = serialrx.LineFramer()
+    while not ser.exhausted():
+        count += len(framer.feed(ser.read(ser.in_waiting or 1)))
+    return count
+
+
+def bench_framing(num_lines=200000):
+    data = make_stream(num_lines)
+    print(f"Framing {num_lines} lines ({len(data)} bytes)")
+
+    for name, framing in (("bytewise", frame_bytewise), ("chunked", frame_chunked)):
+        ser = FakeSerial(data)
+        t_start = time.perf_counter()
+        count = framing(ser)
+        elapsed = time.perf_counter() - t_start
+        assert count == num_lines
+        print(f"  {name:10} {elapsed:8.3f}s {num_lines / elapsed:12.0f} lines/s {len(data) / elapsed / 1e6:8.2f} MB/s")
+
+
+def bench_parse(iterations=20000):
+    messages = [line + "\n" for line in SAMPLE_LINES] * iterations
+    print(f"Parsing {len(messages)} lines")
+
+    results = {}
+    for name, parser in (("legacy", LegacyMessageParser()), ("dispatch", serialrx.MessageParser())):
+        t_start = time.perf_counter()
+        for message in messages:
+            parser.parse_message(message)
+        elapsed = time.perf_counter() - t_start
+        results[name] = {k: v[0] for k, v in parser.get_last_data().items()}
+        print(f"  {name:10} {elapsed:8.3f}s {len(messages) / elapsed:12.0f} lines/s")
+
+    assert results["legacy"] == results["dispatch"]
+
+
+def bench_ingest(num_lines=200000, clients=10):
+    """Whole SerialRX pipeline: framing, parsing, history and fan-out"""
+    print(f"Ingesting {num_lines} lines with {clients} clients")
+
+    sim = simulator.SimulatedSerial(itertools.islice(simulator.synthetic_lines(), num_lines))
+    ser = serialrx.SerialRX(sim)
+    subscribers = [ser.register_client() for _ in range(clients)]
+
+    t_start = time.perf_counter()
+    ser.daemon = True
+    ser.start()
+    while ser.get_cache().next_seq < num_lines:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t_start
+
+    dropped = sum(s.dropped for s in subscribers)
+    print(f"  {elapsed:8.3f}s {num_lines / elapsed:12.0f} lines/s, {dropped} lines dropped by slow clients")
+
+
+def percentiles(values, points=(50, 90, 99, 100)):
+    values = sorted(values)
+    return {p: values[min(len(values) - 1, len(values) * p // 100)] for p in points}
+
+
+_server = None
+
+def start_server():
+    """Run the app on a simulated serial port, return the glutte_serial_web
+    module, the HTTP port and the PtySerial to write lines to"""
+    global _server
+    if _server is None:
+        sim = simulator.PtySerial()
+        config.SERIALPORT = sim.port
+        config.BROKER_SOCKET = ''
+
+        from geventwebsocket.handler import WebSocketHandler
+        from gevent import pywsgi
+        import glutte_serial_web
+
+        server = pywsgi.WSGIServer(('127.0.0.1', 0), glutte_serial_web.app, handler_class=WebSocketHandler, log=None)
+        server.start()
+        _server = (glutte_serial_web, server.server_port, sim)
+    return _server
+
+
+def ws_connect(port, path):
+    """Minimal WebSocket client, returns a generator of received payloads"""
+    sock = socket.create_connection(("127.0.0.1", port))
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((f"GET {path} HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    f = sock.makefile('rb')
+    if b" 101 " not in f.readline():
+        raise RuntimeError("WebSocket handshake failed")
+    while f.readline() not in (b"\r\n", b""):
+        pass
+
+    def frames():
+        while True:
+            head = f.read(2)
+            if len(head) < 2:
+                return
+            opcode = head[0] & 0x0f
+            length = head[1] & 0x7f
+            if length == 126:
+                length = struct.unpack(">H", f.read(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", f.read(8))[0]
+            payload = f.read(length)
+            if opcode == 8:
+                return
+            if opcode in (1, 2):
+                yield payload
+
+    return sock, frames()
+
+
+def measure_latency(port, sim, clients, rate, duration, path, server_pid=None):
+    """Time from the write of a line to the serial port to its reception by
+    each of the /stream clients. The CPU time is the one of this process,
+    plus the one of the server if it runs in another process."""
+    latencies = []
+
+    def client():
+        sock, frames = ws_connect(port, path)
+        try:
+            for payload in frames:
+                now = time.time()
+                for line in payload.decode().split("\n"):
+                    if " BENCH " in line:
+                        latencies.append(now - float(line.split()[-1]))
+        finally:
+            sock.close()
+
+    greenlets = [gevent.spawn(client) for _ in range(clients)]
+    gevent.sleep(0.5)
+
+    cpu_start = time.process_time()
+    server_cpu_start = process_cpu(server_pid) if server_pid else 0
+    interval = 1 / rate
+    for i in range(int(rate * duration)):
+        sim.write(["[{}] BENCH {:.6f}".format(i, time.time())])
+        gevent.sleep(interval)
+    gevent.sleep(1)
+    cpu = time.process_time() - cpu_start
+    server_cpu = process_cpu(server_pid) - server_cpu_start if server_pid else 0
+
+    gevent.killall(greenlets)
+    expected = int(rate * duration) * clients
+    p = percentiles(latencies) if latencies else {}
+    if server_pid:
+        print("  received {}/{} lines, CPU {:.2f}s (server {:.2f}s)".format(len(latencies), expected, cpu + server_cpu, server_cpu))
+    else:
+        print("  received {}/{} lines, CPU {:.2f}s".format(len(latencies), expected, cpu))
+    print("  " + " ".join(f"p{k}={v * 1000:.1f}ms" for k, v in p.items()))
+
+
+def process_cpu(pid):
+    """User and system CPU time of another process, Linux only"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def bench_latency(clients=20, rate=200, duration=10, path="/stream"):
+    """Latency of /stream on the gevent server (see measure_latency)"""
+    module, port, sim = start_server()
+    print(f"Latency of {path} with {clients} clients at {rate} lines/s for {duration}s")
+    measure_latency(port, sim, clients, rate, duration, path)
+
+
+def bench_latency_aio(clients=20, rate=200, duration=10, path="/stream"):
+    """Latency of /stream on the asyncio server (glutte_serial_aio.py), run
+    in its own process as it cannot share this gevent-patched one"""
+    print(f"Latency of {path} on asyncio with {clients} clients at {rate} lines/s for {duration}s")
+
+    sim = simulator.PtySerial()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = subprocess.Popen([sys.executable, "glutte_serial_aio.py", "--serial", sim.port,
+                               "--host", "127.0.0.1", "--port", str(port)],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                gevent.sleep(0.1)
+        measure_latency(port, sim, clients, rate, duration, path, server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_history(sizes=(10000, 100000, 400000)):
+    """/history response time depending on the size of the cache"""
+    module, port, sim = start_server()
+    client = module.app.test_client()
+
+    for size in sizes:
+        now = time.time()
+        cache = History(config.CACHE_MAX_AGE)
+        lines = simulator.synthetic_lines()
+        cache.extend((now - size + i, next(lines)) for i in range(size))
+        module.ser.cache = cache
+
+        for query in ("", "?last=1000", "?since={}".format(now - 3600), "?tag=FSM:"):
+            t_start = time.perf_counter()
+            response = client.get("/history" + query)
+            length = len(response.get_data())
+            elapsed = time.perf_counter() - t_start
+            print(f"  {size:7} lines /history{query:24} {elapsed * 1000:9.1f}ms {length / 1e6:8.2f} MB")
+
+
+def bench_memory(days=6, rate=1.0, step=3600 * 12):
+    """Memory used by SerialRX fed for `days` simulated days at `rate` lines
+    per second, with the history expiring after CACHE_MAX_AGE"""
+    print(f"Memory over {days} simulated days at {rate} lines/s, CACHE_MAX_AGE={config.CACHE_MAX_AGE}s")
+
+    log_dir = config.LOG_DIR
+    config.LOG_DIR = ''
+    ser = serialrx.SerialRX(simulator.SimulatedSerial([]))
+    config.LOG_DIR = log_dir
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    lines = simulator.synthetic_lines()
+
+    t0 = time.time() - days * 86400
+    per_second = max(1, int(rate))
+    period = per_second / rate
+    for second in range(int(days * 86400 / period)):
+        ts = t0 + second * period
+        ser._ingest([(ts, next(lines) + "\n") for _ in range(per_second)])
+
+        if (second * period) % step < period:
+            used = tracemalloc.get_traced_memory()[0] - base
+            print(f"  {second * period / 3600:6.1f}h {len(ser.get_cache()):8} lines {used / 1e6:8.1f} MB")
+
+    tracemalloc.stop()
+
+
+BENCHMARKS = {
+    "framing": bench_framing,
+    "parse": bench_parse,
+    "ingest": bench_ingest,
+    "latency": bench_latency,
+    "latency_aio": bench_latency_aio,
+    "history": bench_history,
+    "memory": bench_memory,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Stand-in for the subset of twx.botapi.TelegramBot used by adsl.ADSL, to run
+# the bot without talking to Telegram:
+#
+#   bot = botstub.StubBot(chat_id=config.TELEGRAM_GROUP)
+#   adsl.ADSL({"default": ser}, bot).start()
+#   bot.command('/status')
+#   bot.sent  # [(chat_id, text, time sent), ...]
+
+import collections
+import threading
+import time
+
+
+class Result:
+    """Mimics the value returned by the twx.botapi calls"""
+
+    def __init__(self, value):
+        self._value = value
+
+    def wait(self):
+        return self._value
+
+
+Chat = collections.namedtuple('Chat', 'id')
+Message = collections.namedtuple('Message', 'chat text')
+Update = collections.namedtuple('Update', 'update_id message')
+
+
+class StubBot:
+    def __init__(self, chat_id, username="stubbot", send_delay=0):
+        self.chat_id = chat_id
+        self.username = None
+        self._username = username
+        # Simulated round-trip time of send_message
+        self.send_delay = send_delay
+
+        self.sent = []
+        self._updates = []
+        self._update_id = 0
+        self._cond = threading.Condition()
+
+    def update_bot_info(self):
+        self.username = self._username
+        return Result(None)
+
+    def command(self, text):
+        """Simulate a message sent to the group"""
+        with self._cond:
+            self._update_id += 1
+            self._updates.append(Update(self._update_id, Message(Chat(self.chat_id), text)))
+            self._cond.notify_all()
+
+    def get_updates(self, offset=None, limit=None, timeout=None):
+        with self._cond:
+            def available():
+                return [u for u in self._updates if offset is None or u.update_id >= offset]
+
+            self._cond.wait_for(available, timeout)
+            updates = available()
+            self._updates = updates
+            return Result(updates[:limit])
+
+    def send_message(self, chat_id, text):
+        time.sleep(self.send_delay)
+        with self._cond:
+            self.sent.append((chat_id, text, time.time()))
+            self._cond.notify_all()
+        return Result(None)
+
+    def wait_sent(self, count, timeout=None):
+        """Wait until at least count messages have been sent"""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self.sent) >= count, timeout)
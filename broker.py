@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Broker mode: a single process owns the serial port, the parser and the
+# ADSL monitor, and publishes the received lines on a Unix socket. The web
+# workers connect to it with BrokerClient instead of opening the port.
+#
+# Protocol: newline-delimited JSON. The broker sends
+#   {"epoch": E, "first_seq": F}
+# the client answers with
+#   {"from_seq": N}
+# and the broker then sends every line from N onwards as
+#   {"seq": S, "entries": [[ts, line], ...]}
+
+import json
+import os
+import socket
+import threading
+
+import config
+import serialrx
+from history import History
+from search import SearchIndex
+
+
+class BrokerServer(threading.Thread):
+    def __init__(self, ser, path):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.ser = ser
+        self.path = path
+
+    def run(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen()
+        print("Broker listening on {}".format(self.path))
+
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        client = None
+        try:
+            f = conn.makefile('rwb')
+            cache = self.ser.get_cache()
+            self._send(f, {"epoch": self.ser.epoch, "first_seq": cache.first_seq})
+            f.flush()
+
+            request = json.loads(f.readline())
+            client = self.ser.register_client(kind="broker")
+            seq = min(request["from_seq"], client.start_seq)
+
+            while True:
+                # Only used as a wake-up, the lines are read from the history
+                # which also has their timestamps
+                client.drain()
+                for seq, entries in self.ser.get_cache().iter_chunks(seq):
+                    self._send(f, {"seq": seq, "entries": entries})
+                    seq += len(entries)
+                f.flush()
+                client.wait()
+        except (OSError, ValueError, KeyError) as e:
+            print("Broker client disconnected: {}".format(e))
+        finally:
+            if client is not None:
+                self.ser.unregister_client(client)
+            conn.close()
+
+    def _send(self, f, message):
+        f.write(json.dumps(message).encode('ascii') + b"\n")
+
+
+class BrokerClient(serialrx.SerialRX):
+    """SerialRX fed by the broker instead of the serial port. The history is
+    mirrored with the same sequence numbers as in the broker, and the lines go
+    through the same parsing with their original timestamps, so the parsed
+    values are the same as the broker's."""
+
+    RECONNECT_DELAY = 1
+
+    def __init__(self, path, source="default"):
+        self.path = path
+        self._sock = None
+        serialrx.SerialRX.__init__(self, source=source)
+
+    def _open(self):
+        print("Using broker on {}".format(self.path))
+        return None
+
+    def _open_log(self):
+        # The broker writes the log
+        return None
+
+    def run(self):
+        print("Broker client starting reception")
+        while not self.event_stop.is_set():
+            try:
+                self._receive()
+            except (OSError, ValueError, KeyError) as e:
+                print("Broker connection lost: {}".format(e))
+            self.event_stop.wait(self.RECONNECT_DELAY)
+
+    def stop(self):
+        self.event_stop.set()
+        if self._sock is not None:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        self.join()
+
+    def _receive(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            self._sock = sock
+            sock.connect(self.path)
+            f = sock.makefile('rwb')
+
+            hello = json.loads(f.readline())
+            if hello["epoch"] != self.epoch:
+                self._reset(hello["epoch"], hello["first_seq"])
+
+            f.write(json.dumps({"from_seq": self.cache.next_seq}).encode('ascii') + b"\n")
+            f.flush()
+
+            for raw in f:
+                message = json.loads(raw)
+                if message["seq"] != self.cache.next_seq:
+                    # Lines expired in the broker while we were away
+                    self._reset(self.epoch, message["seq"])
+                self._ingest([(ts, line + "\n") for ts, line in message["entries"]])
+
+    def _reset(self, epoch, first_seq):
+        self.data_lock.acquire()
+        try:
+            self.epoch = epoch
+            self.cache = History(config.CACHE_MAX_AGE, first_seq, config.CACHE_MAX_BYTES, config.CACHE_HOT_LINES)
+            if self.index is not None:
+                self.index = SearchIndex()
+            for client in self.clients:
+                client.clear()
+                client.next_seq = first_seq
+        finally:
+            self.data_lock.release()
+
+
+if __name__ == "__main__":
+    import adsl
+    import snapshot
+    import sources
+
+    sers = sources.open_sources()
+    scheduler = sources.Scheduler(sers.values())
+    monitor = adsl.ADSL(sers)
+    snapshots = snapshot.open_snapshots(sers, monitor)
+    servers = [BrokerServer(ser, sources.broker_path(name)) for name, ser in sers.items()]
+
+    scheduler.start()
+    monitor.start()
+    if snapshots is not None:
+        snapshots.start()
+    for server in servers:
+        server.start()
+
+    try:
+        servers[0].join()
+    except KeyboardInterrupt:
+        print("Ctrl-C received, quitting")
+    finally:
+        scheduler.stop()
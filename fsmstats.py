@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import bisect
+import collections
+import threading
+
+# Upper bounds, in seconds, of the buckets of the dwell time histograms. The
+# last bucket has no upper bound.
+DWELL_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 10800)
+
+
+class StateStats:
+
+    def __init__(self):
+        self.entries = 0
+        self.dwells = 0
+        self.dwell_total = 0.0
+        self.buckets = [0] * (len(DWELL_BUCKETS) + 1)
+
+    def to_dict(self):
+        return {
+            "entries": self.entries,
+            "dwells": self.dwells,
+            "dwell_total": round(self.dwell_total, 3),
+            "dwell_mean": round(self.dwell_total / self.dwells, 3) if self.dwells else None,
+            "dwell_buckets": self.buckets,
+        }
+
+
+class Window:
+    """Counts of the state entries and dwell time histograms over the last
+    `length` seconds. Events are added in order and subtracted again when
+    they leave the window, so every update is amortized O(1)."""
+
+    def __init__(self, length):
+        self.length = length
+        # (ts, state, dwell, bucket) with dwell None for the entries
+        self._events = collections.deque()
+        self.states = {}
+
+    def _stats(self, state):
+        stats = self.states.get(state)
+        if stats is None:
+            stats = self.states[state] = StateStats()
+        return stats
+
+    def add(self, ts, state, dwell=None):
+        stats = self._stats(state)
+        if dwell is None:
+            stats.entries += 1
+            self._events.append((ts, state, None, None))
+        else:
+            bucket = bisect.bisect_left(DWELL_BUCKETS, dwell)
+            stats.dwells += 1
+            stats.dwell_total += dwell
+            stats.buckets[bucket] += 1
+            self._events.append((ts, state, dwell, bucket))
+
+    def expire(self, now):
+        limit = now - self.length
+        events = self._events
+        while events and events[0][0] < limit:
+            _, state, dwell, bucket = events.popleft()
+            stats = self.states[state]
+            if dwell is None:
+                stats.entries -= 1
+            else:
+                stats.dwells -= 1
+                stats.dwell_total -= dwell
+                stats.buckets[bucket] -= 1
+            if stats.entries == 0 and stats.dwells == 0:
+                del self.states[state]
+
+
+class FsmStats:
+    """Timeline of the FSM transitions, and per-state entry counts and dwell
+    time histograms over sliding windows, updated on every transition. A
+    dwell time is counted in the windows when the state is left."""
+
+    def __init__(self, windows, timeline_length):
+        self._lock = threading.Lock()
+        self.timeline = collections.deque(maxlen=timeline_length)
+        self.windows = {length: Window(length) for length in windows}
+        self.current_state = None
+        self._since = None
+
+    def _leave(self, ts):
+        if self.current_state is not None:
+            dwell = max(0.0, ts - self._since)
+            for window in self.windows.values():
+                window.add(ts, self.current_state, dwell)
+
+    def transition(self, ts, state):
+        with self._lock:
+            if state == self.current_state:
+                return
+            self._leave(ts)
+            self.current_state = state
+            self._since = ts
+            self.timeline.append((ts, state))
+            for window in self.windows.values():
+                window.add(ts, state)
+                window.expire(ts)
+
+    def reset(self, ts):
+        """The FSM restarted: the current state ends there"""
+        with self._lock:
+            self._leave(ts)
+            self.current_state = None
+            self._since = None
+            self.timeline.append((ts, None))
+
+    def summary(self, now):
+        with self._lock:
+            for window in self.windows.values():
+                window.expire(now)
+
+            return {
+                "current": {"state": self.current_state, "since": self._since,
+                            "duration": None if self._since is None else round(now - self._since, 3)},
+                "dwell_buckets": DWELL_BUCKETS,
+                "windows": {str(length): {state: stats.to_dict() for state, stats in window.states.items()}
+                            for length, window in self.windows.items()},
+            }
+
+    def get_timeline(self, since=None):
+        with self._lock:
+            timeline = list(self.timeline)
+        if since is not None:
+            timeline = timeline[bisect.bisect_left(timeline, (since,)):]
+        return timeline
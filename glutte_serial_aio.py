@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# Alternative server running everything on one asyncio event loop, with
+# aiohttp instead of gevent and Flask:
+#
+#   python glutte_serial_aio.py [--host 0.0.0.0] [--port 5000]
+#
+# The serial ports are read by the loop as soon as they are readable, the
+# lines go through the same SerialRX (parsing, history, log, search) and
+# Monitor as in the gevent server, and are fanned out to the /stream clients
+# through asyncio queues. The Telegram bot talks to the Bot API with aiohttp.
+# It serves /, /stream, /history, /stats and /metrics, for every source
+# like the gevent server. BROKER_SOCKET is ignored, this server always
+# reads the serial ports itself.
+
+import argparse
+import asyncio
+import os
+import re
+import time
+
+import aiohttp
+import jinja2
+import serial
+from aiohttp import web
+
+import adsl
+import config
+import metrics
+import serialrx
+import snapshot
+import sources
+import webformat
+
+STREAM_IDLE_TIMEOUT = 30
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class AsyncSubscriber:
+    """Queue of the batches of lines for one /stream client. Like
+    serialrx.Subscriber, the oldest lines are dropped once more than
+    max_lines are waiting."""
+
+    def __init__(self, max_lines, seq, line_filter=None, source="default"):
+        self.max_lines = max_lines
+        self.line_filter = line_filter
+        self.start_seq = seq
+        self.next_seq = seq
+        self.closed = False
+        self._queue = asyncio.Queue()
+        self._pending = 0
+        self._lost = 0
+        self._lines_dropped = serialrx.lines_dropped.child(source)
+
+    def __len__(self):
+        return self._pending
+
+    def push(self, lines, next_seq, lost=0):
+        """Queue the lines, lost being the number of lines dropped before
+        them upstream"""
+        self._queue.put_nowait((lines, next_seq))
+        self._pending += len(lines)
+        self._lost += lost
+
+        while self._pending > self.max_lines and self._queue.qsize() > 1:
+            dropped, _ = self._queue.get_nowait()
+            self._pending -= len(dropped)
+            self._lost += len(dropped)
+            self._lines_dropped.inc(len(dropped))
+
+    async def get(self, timeout=None):
+        """Wait for lines and return (lines, next_seq, lost) with all the
+        pending ones, or None if nothing came within the timeout"""
+        try:
+            lines, self.next_seq = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        lines = list(lines)
+        while not self._queue.empty():
+            more, self.next_seq = self._queue.get_nowait()
+            lines.extend(more)
+        self._pending = 0
+        lost = self._lost
+        self._lost = 0
+        return lines, self.next_seq, lost
+
+    def close(self):
+        self.closed = True
+        self._queue.put_nowait(([], self.next_seq))
+
+
+class AsyncSource:
+    """One source on the event loop. Its SerialRX is not started: the loop
+    calls read_available() whenever the port is readable. Every filter in
+    use has one serialrx.Subscriber, drained right after each read and
+    fanned out to the AsyncSubscribers with that filter."""
+
+    def __init__(self, ser, monitor, on_alarms):
+        self.ser = ser
+        self.monitor = monitor
+        self._on_alarms = on_alarms
+        self._framer = serialrx.LineFramer(ser.source)
+        self._monitor_client = ser.register_client(kind="monitor")
+        # Filter key -> [serialrx.Subscriber, set of AsyncSubscriber]
+        self._groups = {}
+        self._deadline = None
+        # Set and replaced when the parsed values change
+        self.changed = asyncio.Event()
+        self._version = ser.get_parser().version
+
+    def start(self, loop):
+        transport = self.ser.ser
+        if not hasattr(transport, "fileno"):
+            raise ValueError("The asyncio server needs serial ports with a file descriptor")
+        transport.timeout = 0
+        loop.add_reader(transport.fileno(), self._on_readable)
+        if self.ser.log is not None:
+            self.ser.log.start()
+        self._update_monitor()
+
+    def stop(self, loop):
+        loop.remove_reader(self.ser.ser.fileno())
+        if self._deadline is not None:
+            self._deadline.cancel()
+        if self.ser.log is not None:
+            self.ser.log.stop()
+
+    def _on_readable(self):
+        try:
+            self.ser.read_available(self._framer)
+        except (serial.SerialException, OSError) as e:
+            # The fd of an unplugged port stays readable
+            print("Stop reading source {}: {}".format(self.ser.source, e))
+            asyncio.get_event_loop().remove_reader(self.ser.ser.fileno())
+            return
+
+        for client, subscribers in self._groups.values():
+            lines, next_seq, lost = client.drain()
+            if lines or lost:
+                for subscriber in subscribers:
+                    subscriber.push(lines, next_seq, lost)
+
+        version = self.ser.get_parser().version
+        if version != self._version:
+            self._version = version
+            changed = self.changed
+            self.changed = asyncio.Event()
+            changed.set()
+
+        self._update_monitor()
+
+    def _update_monitor(self):
+        lines, _, _ = self._monitor_client.drain()
+        self.monitor.update(lines)
+        self._on_alarms()
+
+        if self._deadline is not None:
+            self._deadline.cancel()
+        timeout = self.monitor.deadlines.timeout()
+        if timeout is not None:
+            self._deadline = asyncio.get_event_loop().call_later(timeout, self._update_monitor)
+
+    def subscribe(self, line_filter=None):
+        key = None if line_filter is None else line_filter.key
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = [self.ser.register_client(line_filter, kind="group"), set()]
+        subscriber = AsyncSubscriber(config.LINES_TO_KEEP, self.ser.get_cache().next_seq, line_filter, self.ser.source)
+        group[1].add(subscriber)
+        return subscriber
+
+    def subscribers(self):
+        return [subscriber for _, subscribers in list(self._groups.values()) for subscriber in subscribers]
+
+    def unsubscribe(self, subscriber):
+        key = None if subscriber.line_filter is None else subscriber.line_filter.key
+        client, subscribers = self._groups[key]
+        subscribers.discard(subscriber)
+        if not subscribers:
+            self.ser.unregister_client(client)
+            del self._groups[key]
+
+
+class TelegramAPI:
+    """The calls of the Telegram Bot API used by the bot"""
+
+    def __init__(self, session, token):
+        self._session = session
+        self._url = "https://api.telegram.org/bot{}/".format(token)
+
+    async def call(self, method, **params):
+        async with self._session.post(self._url + method, json=params) as response:
+            result = await response.json()
+        if not result.get("ok"):
+            raise RuntimeError(result.get("description"))
+        return result["result"]
+
+
+class AsyncOutbox(adsl.Outbox):
+    """adsl.Outbox on the event loop, with the same coalescing and splitting
+    of the alarms and the same minimal interval between the messages"""
+
+    def __init__(self, api, chat_id):
+        adsl.Outbox.__init__(self, None, chat_id)
+        self._api = api
+        self._queue = asyncio.Queue()
+
+    def put(self, text, coalesce=False):
+        self._queue.put_nowait((text, coalesce))
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            text, coalesce = await self._queue.get()
+
+            queued = []
+            if coalesce:
+                deadline = loop.time() + self.COALESCE_DELAY
+                while True:
+                    try:
+                        queued.append(await asyncio.wait_for(self._queue.get(), max(0, deadline - loop.time())))
+                    except asyncio.TimeoutError:
+                        break
+
+            for message in self.messages(text, queued):
+                await self._send(message)
+
+    async def _send(self, text):
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        t_start = time.monotonic()
+        try:
+            await self._api.call("sendMessage", chat_id=self._chat_id, text=text)
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+            print("Could not send Telegram message: {}".format(e))
+        self._sent(t_start)
+
+
+async def run_bot(api, bot):
+    """Answer the commands sent to the group, see adsl.ADSL"""
+    me = await api.call("getMe")
+    print("Telegram bot {} ready".format(me.get("username")))
+
+    if bot.restored is None:
+        bot.outbox.put(b'\xe2\x84\xb9 Hello ! I have been started, so everything has been reset on my side.'.decode())
+    else:
+        bot.outbox.put(b'\xe2\x84\xb9 Hello ! I have been restarted, and restored my state from {} seconds before.'.decode().format(int(time.time() - bot.restored)))
+
+    offset = None
+    while True:
+        try:
+            updates = await api.call("getUpdates", offset=offset, limit=1, timeout=15)
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+            print("Could not get Telegram updates: {}".format(e))
+            await asyncio.sleep(5)
+            continue
+
+        for update in updates:
+            offset = update["update_id"] + 1
+            message = update.get("message") or {}
+            chat_id = message.get("chat", {}).get("id")
+            if str(chat_id) == str(config.TELEGRAM_GROUP):
+                bot.handle_command(message.get("text") or "")
+            else:
+                print(f"Ignore chat ID {chat_id}")
+
+
+async def run_snapshots(snapshots):
+    while True:
+        await asyncio.sleep(snapshots.interval)
+        try:
+            snapshots.save()
+        except OSError as e:
+            print("Could not save snapshot {}: {}".format(snapshots.path, e))
+
+
+def get_source(request):
+    name = request.match_info.get("source")
+    if name is None:
+        return request.app["default"]
+    source = request.app["sources"].get(name)
+    if source is None:
+        raise web.HTTPNotFound(text="Unknown source, sources are: {}".format(", ".join(request.app["sources"])))
+    return source
+
+def time_arg(request, name):
+    value = request.query.get(name)
+    if value is None:
+        return None
+    try:
+        return webformat.parse_time(value)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"Invalid {name} timestamp")
+
+def query_arg(request, name, default=None, type=int):
+    # Like request.args.get() in Flask
+    try:
+        return type(request.query[name])
+    except (KeyError, ValueError):
+        return default
+
+def line_filter_arg(request):
+    tags = request.query.getall('tag', [])
+    regex = request.query.get('regex')
+    if not tags and not regex:
+        return None
+    try:
+        return serialrx.LineFilter(tags, regex)
+    except re.error as e:
+        raise web.HTTPBadRequest(text=f"Invalid regex: {e}")
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or '"{}"'.format(etag) in tags
+
+
+async def index(request):
+    ser = get_source(request).ser
+    prefix = "/" + request.match_info["source"] if "source" in request.match_info else ""
+    body = request.app["templates"].get_template("index.html").render(
+        next_seq=ser.get_cache().next_seq, epoch=ser.epoch, max_lines=config.LAST_LINE_TO_KEEP, prefix=prefix)
+    return web.Response(text=body, content_type="text/html")
+
+async def history(request):
+    ser = get_source(request).ser
+    since = time_arg(request, 'since')
+    until = time_arg(request, 'until')
+    last = query_arg(request, 'last')
+    line_filter = line_filter_arg(request)
+
+    try:
+        entries = webformat.history_entries(ser, since, until, last, line_filter)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/plain', 'Vary': 'Accept-Encoding'})
+    chunks = webformat.format_history(entries)
+    if webformat.encoding_quality(request.headers.get("Accept-Encoding", ""), "gzip") > 0:
+        chunks = webformat.gzip_chunks(chunks)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        chunks = (chunk.encode() for chunk in chunks)
+
+    await response.prepare(request)
+    for chunk in chunks:
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+async def stats(request):
+    # Same as in the gevent server: precomputed body, ETag and wait=N
+    source = get_source(request)
+    parser = source.ser.get_parser()
+
+    wait = query_arg(request, 'wait', 0, float)
+    for etag, body, version, timeout in webformat.poll_stats(parser, lambda etag: etag_matches(request, etag), wait):
+        changed = source.changed
+        if timeout is not None and parser.version == version:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    headers = {'ETag': '"{}"'.format(etag), 'Cache-Control': 'no-cache'}
+    if etag_matches(request, etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type='application/json', headers=headers)
+
+async def metrics_page(request):
+    return web.Response(body=metrics.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+async def watch_socket(ws, subscriber):
+    # Only returns once the socket is closed
+    async for _ in ws:
+        pass
+    subscriber.close()
+
+async def stream(request):
+    # Same protocol as in the gevent server, see glutte_serial_web.stream()
+    source = get_source(request)
+    ser = source.ser
+    from_seq = query_arg(request, 'from_seq')
+    with_seq = from_seq is not None
+    epoch = query_arg(request, 'epoch')
+    line_filter = line_filter_arg(request)
+    compressor = webformat.StreamCompressor() if query_arg(request, 'compress') else None
+
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    async def send(lines, next_seq, lost):
+        frame = webformat.stream_frame(lines, ser.epoch, next_seq, lost, with_seq, compressor)
+        if compressor is not None:
+            await ws.send_bytes(frame)
+        else:
+            await ws.send_str(frame)
+
+    subscriber = source.subscribe(line_filter)
+    watcher = asyncio.ensure_future(watch_socket(ws, subscriber))
+    try:
+        if with_seq and epoch == ser.epoch:
+            for lines, next_seq, lost in webformat.replay(ser.get_cache(), from_seq, subscriber.start_seq, line_filter):
+                await send(lines, next_seq, lost)
+
+        while not subscriber.closed and not ws.closed:
+            batch = await subscriber.get(STREAM_IDLE_TIMEOUT)
+            if batch is not None and (batch[0] or batch[2]):
+                await send(*batch)
+    except ConnectionResetError:
+        pass
+    finally:
+        watcher.cancel()
+        source.unsubscribe(subscriber)
+
+    return ws
+
+
+def make_app():
+    sers = sources.open_sources()
+    bot = adsl.ADSL(sers)
+    snapshots = snapshot.open_snapshots(sers, bot)
+
+    def on_alarms():
+        # Checking the auto-acked alarms sets alarms_changed again, so that
+        # they are cleared by the following check
+        while bot.monitors.alarms_changed.is_set() and bot.outbox is not None:
+            bot.monitors.alarms_changed.clear()
+            bot.check_alarms()
+
+    app = web.Application()
+    app["templates"] = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.join(BASE_DIR, "templates")), autoescape=True)
+    app["tasks"] = []
+    # The stream clients are the AsyncSubscribers, not the clients of SerialRX
+    sources.register_gauges(sers, lambda name: app["sources"][name].subscribers() if "sources" in app else [])
+
+    async def start(app):
+        loop = asyncio.get_event_loop()
+        app["sources"] = {name: AsyncSource(ser, bot.monitors.monitors[name], on_alarms) for name, ser in sers.items()}
+        app["default"] = next(iter(app["sources"].values()))
+        for source in app["sources"].values():
+            source.start(loop)
+
+        if snapshots is not None:
+            app["tasks"].append(asyncio.ensure_future(run_snapshots(snapshots)))
+
+        if config.TELEGRAM_API_TOKEN and config.TELEGRAM_GROUP:
+            app["session"] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+            api = TelegramAPI(app["session"], config.TELEGRAM_API_TOKEN)
+            bot.outbox = AsyncOutbox(api, config.TELEGRAM_GROUP)
+            app["tasks"].append(asyncio.ensure_future(bot.outbox.run()))
+            app["tasks"].append(asyncio.ensure_future(run_bot(api, bot)))
+            on_alarms()
+        else:
+            print("Telegram not configured, ADSL not running.")
+
+    async def stop(app):
+        loop = asyncio.get_event_loop()
+        for task in app["tasks"]:
+            task.cancel()
+        for source in app["sources"].values():
+            source.stop(loop)
+        if "session" in app:
+            await app["session"].close()
+        if snapshots is not None:
+            snapshots.stop()
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+
+    for prefix in ("", "/{source}"):
+        app.router.add_get(prefix + "/", index)
+        app.router.add_get(prefix + "/stream", stream)
+        app.router.add_get(prefix + "/history", history)
+        app.router.add_get(prefix + "/stats", stats)
+    app.router.add_get("/metrics", metrics_page)
+    app.router.add_static("/static", os.path.join(BASE_DIR, "static"))
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the glutte serial web server on asyncio")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--serial", help="serial port of the default source, instead of SERIALPORT")
+    args = parser.parse_args()
+
+    if args.serial:
+        config.SERIALPORT = args.serial
+
+    web.run_app(make_app(), host=args.host, port=args.port, print=None)
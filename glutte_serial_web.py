@@ -22,83 +22,239 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+if __name__ == "__main__":
+    # The gunicorn gevent worker patches the standard library itself. The dev
+    # server has to do it before anything else is imported, so that the
+    # threading.Event the clients wait on yield to the other greenlets.
+    from gevent import monkey
+    monkey.patch_all()
+
 import time
-import datetime
-import json
+import re
+import gevent
 from geventwebsocket.handler import WebSocketHandler
-from gevent import pywsgi, Timeout
-from flask import Flask, Response, render_template, jsonify
+from geventwebsocket.exceptions import WebSocketError
+from gevent import pywsgi
+from flask import Flask, Response, render_template, jsonify, request, abort, stream_with_context
 from flask_sockets import Sockets
 import serialrx
 import adsl
+import broker
+import snapshot
+import sources
+import webformat
 import config
+import metrics
 
 app = Flask(__name__)
 sockets = Sockets(app)
 
-ser = serialrx.SerialRX()
-adsl = adsl.ADSL(ser)
+if config.BROKER_SOCKET:
+    # The serial ports and the ADSL monitor belong to the broker process
+    sers = {name: broker.BrokerClient(sources.broker_path(name), name) for name, _, _ in sources.configured()}
+    adsl = None
+    snapshots = None
+else:
+    sers = sources.open_sources()
+    adsl = adsl.ADSL(sers)
+    snapshots = snapshot.open_snapshots(sers, adsl)
+
+scheduler = sources.Scheduler(sers.values())
+# The first source is also served without the /<source> prefix
+ser = next(iter(sers.values()))
+
+def get_ser(source):
+    if source is None:
+        return ser
+    if source not in sers:
+        abort(404, "Unknown source, sources are: {}".format(", ".join(sers)))
+    return sers[source]
+
+sources.register_gauges(sers)
 
 @app.route('/')
-def index():
-    return render_template('index.html', last_lines=ser.get_last_lines())
+@app.route('/<source>/')
+def index(source=None):
+    ser = get_ser(source)
+    # The page gets the last lines by resuming the stream from before them
+    return render_template('index.html', next_seq=ser.get_cache().next_seq, epoch=ser.epoch,
+                           max_lines=config.LAST_LINE_TO_KEEP, prefix="" if source is None else "/" + source)
+
+def parse_time_arg(name):
+    """Read a timestamp query parameter, given either as seconds since the
+    epoch or as an ISO 8601 date (UTC unless it carries an offset)"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+
+    try:
+        return webformat.parse_time(value)
+    except ValueError:
+        abort(400, f"Invalid {name} timestamp")
+
+def line_filter_args():
+    """Build the LineFilter given by the tag (repeatable) and regex query
+    parameters, or None to get all lines"""
+    tags = request.args.getlist('tag')
+    regex = request.args.get('regex')
+    if not tags and not regex:
+        return None
+
+    try:
+        return serialrx.LineFilter(tags, regex)
+    except re.error as e:
+        abort(400, f"Invalid regex: {e}")
 
 @app.route('/history')
-def history():
-    text = "\n".join(f"{entry['ts'].isoformat()} {entry['line']}" for entry in ser.get_cache())
-    return Response(text, mimetype='text/plain')
+@app.route('/<source>/history')
+def history(source=None):
+    ser = get_ser(source)
+    since = parse_time_arg('since')
+    until = parse_time_arg('until')
+    last = request.args.get('last', type=int)
+    line_filter = line_filter_args()
+
+    try:
+        entries = webformat.history_entries(ser, since, until, last, line_filter)
+    except ValueError as e:
+        abort(400, str(e))
+
+    chunks = webformat.format_history(entries)
+    headers = {'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        chunks = webformat.gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(stream_with_context(chunks), mimetype='text/plain', headers=headers)
+
+SEARCH_LIMIT = 1000
+
+@app.route('/search')
+@app.route('/<source>/search')
+def search(source=None):
+    ser = get_ser(source)
+    index = ser.get_index()
+    if index is None:
+        abort(404, "The search index is disabled")
+
+    query = request.args.get('q', '')
+    since = parse_time_arg('since')
+    context = request.args.get('context', 0, type=int)
+    limit = request.args.get('limit', SEARCH_LIMIT, type=int)
+
+    cache = ser.get_cache()
+    since_seq = cache.seq_at(since) if since is not None else 0
+    seqs = index.search(query, since_seq, limit)
+
+    return Response(stream_with_context(webformat.format_search(cache, seqs, context)), mimetype='text/plain')
 
 @app.route('/stats')
-def stats():
-    t_now = time.time()
-    values = ser.get_parsed_values()
+@app.route('/<source>/stats')
+def stats(source=None):
+    # The body is precomputed by the parser. With If-None-Match and wait=N,
+    # the request waits up to N seconds for the values to change before
+    # answering 304 Not Modified.
+    parser = get_ser(source).get_parser()
+
+    wait = request.args.get('wait', 0, type=float)
+    for etag, body, version, timeout in webformat.poll_stats(parser, request.if_none_match.contains, wait):
+        if timeout is not None:
+            parser.wait_change(version, timeout)
+
+    response = Response(body, mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@app.route('/stats/history')
+@app.route('/<source>/stats/history')
+def stats_history(source=None):
+    ser = get_ser(source)
+    metric = request.args.get('metric')
+    res = request.args.get('res', 'raw')
+    since = parse_time_arg('since')
 
-    out_json = {}
+    series = ser.get_metrics().get(metric, res, since)
+    if series is None:
+        abort(404, "Unknown metric or resolution, metrics are: {}".format(", ".join(ser.get_metrics().metrics())))
 
-    for k in values:
-        value, ts, timeout = values[k]
-        if ts + timeout < t_now:
-            out_json[k] = None
-        else:
-            out_json[k] = value
+    return jsonify(metric=metric, res=res, **series)
 
-    return jsonify(out_json)
+@app.route('/stats/fsm')
+@app.route('/<source>/stats/fsm')
+def stats_fsm(source=None):
+    ser = get_ser(source)
+    now = time.time()
+    fsm = ser.get_fsm_stats()
+    out = fsm.summary(now)
+    if request.args.get('timeline'):
+        since = parse_time_arg('since')
+        out["timeline"] = fsm.get_timeline(now - 3600 if since is None else since)
+    return jsonify(out)
+
+@app.route('/metrics')
+def metrics_page():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+STREAM_IDLE_TIMEOUT = 30
+
+def watch_socket(socket, client):
+    # The browser sends a keep-alive every 10 seconds, receive() only returns
+    # None once the socket is closed
+    try:
+        while socket.receive() is not None:
+            pass
+    except WebSocketError:
+        pass
+    finally:
+        client.close()
 
 @sockets.route('/stream')
-def stream(socket):
+@sockets.route('/<source>/stream')
+def stream(socket, source=None):
+    # With from_seq, frames are JSON objects giving the sequence number to
+    # resume from and the number of lines lost, and the lines since from_seq
+    # are replayed from the history first, provided the epoch did not change
+    # (i.e. no restart in between).
+    # tag and regex select the lines to send, clients with the same filter
+    # share its evaluation.
+    # With compress=1, frames are binary and compressed (see webformat.StreamCompressor)
+    from_seq = request.args.get('from_seq', type=int)
+    with_seq = from_seq is not None
+    epoch = request.args.get('epoch', type=int)
+    line_filter = line_filter_args()
+    compressor = webformat.StreamCompressor() if request.args.get('compress', type=int) else None
+    ser = get_ser(source)
+
+    client = ser.register_client(line_filter, kind="stream")
+    watcher = gevent.spawn(watch_socket, socket, client)
     try:
-        queue = ser.register_client()
-        error = False
-
-        while not socket.closed and not error:
-            # Force to check if the client is still here
-            try:
-                with Timeout(0.1, False):
-                    socket.receive()
-            except:
-                pass
-            try:
-                line = queue.popleft()
-                socket.send(line)
-            except IndexError:
-                pass
-            except:
-                error = True
-            time.sleep(0.1)
-    except:
-        raise
+        if with_seq and epoch == ser.epoch:
+            for lines, next_seq, lost in webformat.replay(ser.get_cache(), from_seq, client.start_seq, line_filter):
+                socket.send(webformat.stream_frame(lines, ser.epoch, next_seq, lost, with_seq, compressor))
+
+        while not client.closed and not socket.closed:
+            client.wait(STREAM_IDLE_TIMEOUT)
+            lines, next_seq, lost = client.drain()
+            if lines:
+                socket.send(webformat.stream_frame(lines, ser.epoch, next_seq, lost, with_seq, compressor))
+    except WebSocketError:
+        pass
     finally:
-        ser.unregister_client(queue)
+        watcher.kill()
+        ser.unregister_client(client)
 
-ser.start()
-adsl.start()
+scheduler.start()
+if adsl is not None:
+    adsl.start()
+if snapshots is not None:
+    snapshots.start()
 
 if __name__ == "__main__":
-    print("You're running in dev mode, only one client at a time will works ! Please use gunicorn to fix this :)")
+    print("You're running in dev mode, please use gunicorn in production :)")
     try:
         http_server = pywsgi.WSGIServer(('', 5000), app, handler_class=WebSocketHandler)
         http_server.serve_forever()
     except KeyboardInterrupt:
         print("Ctrl-C received, quitting")
     finally:
-        ser.stop()
+        scheduler.stop()
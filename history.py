@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import array
+import bisect
+import collections
+import sys
+import threading
+import zlib
+
+
+class Block:
+    """Entries of the cold part of the History, compressed together. The
+    timestamps come first in the compressed data, then the lines separated
+    by newlines."""
+
+    def __init__(self, first_seq, ts, lines):
+        self.first_seq = first_seq
+        self.count = len(lines)
+        self.t_min = ts[0]
+        self.t_max = ts[-1]
+        self.data = zlib.compress(ts.tobytes() + "\n".join(lines).encode())
+        self.size = sys.getsizeof(self.data) + 100
+
+    def decode(self):
+        raw = zlib.decompress(self.data)
+        ts = array.array('d')
+        ts.frombytes(raw[:self.count * ts.itemsize])
+        lines = raw[self.count * ts.itemsize:].decode().split("\n")
+        return ts, lines
+
+
+class History:
+    """Time-ordered store of the lines received from the serial port.
+
+    Entries are kept as a timestamp (float epoch) in an array and the line in
+    a parallel list. Expired entries are dropped from the head by moving a
+    start index, and the lists are only compacted once the dead part gets
+    bigger than the live one, so both append and expire are amortized O(1).
+    Lookups by timestamp use binary search on the timestamp array.
+
+    If hot_lines is given, only the last hot_lines entries are kept as is,
+    older ones are sealed into compressed Blocks of BLOCK_SIZE entries. The
+    blocks are only decompressed when they are read, and expire as a whole
+    once their newest entry is older than max_age. If max_bytes is given, the
+    oldest entries are also dropped to keep memory() under it.
+
+    Every entry gets a sequence number, incremented for each line appended
+    and independent of the expiration of older entries."""
+
+    COMPACT_MIN = 1024
+    CHUNK_SIZE = 1000
+    BLOCK_SIZE = 4096
+    # Number of decompressed blocks kept for the following reads
+    DECODED_BLOCKS = 4
+
+    def __init__(self, max_age, first_seq=0, max_bytes=None, hot_lines=None):
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hot_lines = hot_lines
+
+        self._lock = threading.Lock()
+        self._ts = array.array('d')
+        self._lines = []
+        self._head = 0
+        # Sequence number of the entry at _head
+        self._first_seq = first_seq
+        # Size of the live line objects
+        self._line_bytes = 0
+
+        # Cold part, with the first sequence number and the newest timestamp
+        # of each block for the lookups
+        self._blocks = []
+        self._block_seqs = []
+        self._block_ends = []
+        self._block_bytes = 0
+        self._decoded = collections.OrderedDict()
+
+    def __len__(self):
+        return self._first_seq - self.first_seq + len(self._lines) - self._head
+
+    def __iter__(self):
+        return self.iter_range()
+
+    @property
+    def first_seq(self):
+        blocks = self._blocks
+        return blocks[0].first_seq if blocks else self._first_seq
+
+    @property
+    def next_seq(self):
+        with self._lock:
+            return self._first_seq + len(self._lines) - self._head
+
+    def memory(self):
+        """Approximate memory used by the live entries, in bytes"""
+        hot = len(self._lines) - self._head
+        return hot * (self._ts.itemsize + 8) + self._line_bytes + self._block_bytes
+
+    def append(self, ts, line):
+        self.extend(((ts, line),))
+
+    def extend(self, entries):
+        with self._lock:
+            for ts, line in entries:
+                self._ts.append(ts)
+                self._lines.append(line)
+                self._line_bytes += sys.getsizeof(line)
+
+            if self.hot_lines is not None:
+                while len(self._lines) - self._head >= self.hot_lines + self.BLOCK_SIZE:
+                    self._seal()
+            self._enforce_budget()
+
+    def _seal(self):
+        start = self._head
+        end = start + self.BLOCK_SIZE
+        block = Block(self._first_seq, self._ts[start:end], self._lines[start:end])
+        self._blocks.append(block)
+        self._block_seqs.append(block.first_seq)
+        self._block_ends.append(block.t_max)
+        self._block_bytes += block.size
+        self._drop_hot(end)
+
+    def _drop_hot(self, end):
+        for i in range(self._head, end):
+            self._line_bytes -= sys.getsizeof(self._lines[i])
+        self._first_seq += end - self._head
+        self._head = end
+
+        if self._head > self.COMPACT_MIN and self._head * 2 > len(self._lines):
+            del self._ts[:self._head]
+            del self._lines[:self._head]
+            self._head = 0
+
+    def _drop_block(self):
+        block = self._blocks.pop(0)
+        del self._block_seqs[0]
+        del self._block_ends[0]
+        self._block_bytes -= block.size
+        self._decoded.pop(id(block), None)
+
+    def _enforce_budget(self):
+        if self.max_bytes is None:
+            return
+        while self._blocks and self.memory() > self.max_bytes:
+            self._drop_block()
+        if self.memory() > self.max_bytes:
+            end = self._head
+            excess = self.memory() - self.max_bytes
+            while end < len(self._lines) and excess > 0:
+                excess -= self._ts.itemsize + 8 + sys.getsizeof(self._lines[end])
+                end += 1
+            self._drop_hot(end)
+
+    def expire(self, now):
+        with self._lock:
+            while self._blocks and self._block_ends[0] < now - self.max_age:
+                self._drop_block()
+            if not self._blocks:
+                self._drop_hot(bisect.bisect_right(self._ts, now - self.max_age, self._head))
+
+    def oldest(self):
+        with self._lock:
+            if self._blocks:
+                return self._blocks[0].t_min
+            if self._head == len(self._lines):
+                return None
+            return self._ts[self._head]
+
+    def _decode(self, block):
+        decoded = self._decoded.get(id(block))
+        if decoded is not None and decoded[0] is block:
+            return decoded[1]
+
+        entries = block.decode()
+        with self._lock:
+            self._decoded[id(block)] = (block, entries)
+            while len(self._decoded) > self.DECODED_BLOCKS:
+                self._decoded.popitem(last=False)
+        return entries
+
+    def seq_at(self, ts):
+        """Sequence number of the first entry with a timestamp >= ts"""
+        with self._lock:
+            i = bisect.bisect_left(self._block_ends, ts)
+            if i == len(self._blocks):
+                start = bisect.bisect_left(self._ts, ts, self._head)
+                return self._first_seq + start - self._head
+            block = self._blocks[i]
+
+        if ts <= block.t_min:
+            return block.first_seq
+        times, _ = self._decode(block)
+        return block.first_seq + bisect.bisect_left(times, ts)
+
+    def range(self, since=None, until=None):
+        """Return the list of (ts, line) entries with since <= ts < until"""
+        return list(self.iter_range(since, until))
+
+    def last(self, count):
+        return list(self.iter_range(last=count))
+
+    def iter_range(self, since=None, until=None, last=None):
+        """Iterate over the (ts, line) entries with since <= ts < until, or
+        only the last ones of them"""
+        start_seq = self.first_seq if since is None else self.seq_at(since)
+        end_seq = self.next_seq if until is None else self.seq_at(until)
+        if last is not None:
+            start_seq = max(start_seq, end_seq - last)
+
+        for _, chunk in self.iter_chunks(start_seq, end_seq):
+            yield from chunk
+
+    def iter_chunks(self, start_seq, end_seq=None):
+        """Iterate over the entries from start_seq up to end_seq excluded, as
+        (seq, entries) chunks, seq being the sequence number of the first of
+        the entries. The entries are copied out chunk by chunk so that the
+        lock is never held for long, and the blocks are decompressed outside
+        of it."""
+        seq = start_seq
+        while end_seq is None or seq < end_seq:
+            block = None
+            with self._lock:
+                # Entries may have expired, been sealed, or the lists may have
+                # been compacted since the last chunk
+                seq = max(seq, self.first_seq)
+                if end_seq is not None and seq >= end_seq:
+                    # The rest of the range expired
+                    break
+                if seq < self._first_seq:
+                    block = self._blocks[bisect.bisect_right(self._block_seqs, seq) - 1]
+                else:
+                    start = self._head + seq - self._first_seq
+                    stop = start + self.CHUNK_SIZE
+                    if end_seq is not None:
+                        stop = min(stop, self._head + end_seq - self._first_seq)
+                    chunk = list(zip(self._ts[start:stop], self._lines[start:stop]))
+
+            if block is not None:
+                times, lines = self._decode(block)
+                start = seq - block.first_seq
+                stop = start + self.CHUNK_SIZE
+                if end_seq is not None:
+                    stop = min(stop, end_seq - block.first_seq)
+                chunk = list(zip(times[start:stop], lines[start:stop]))
+
+            if not chunk:
+                break
+            yield seq, chunk
+            seq += len(chunk)
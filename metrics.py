@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Counters, histograms and gauges exposed in the Prometheus text format on
+# /metrics. Counters and histograms are meant to be updated from a single
+# thread, so increments are plain additions without any locking. Metrics
+# updated from several threads (e.g. one per source) have labels, and each
+# thread updates its own child, see child().
+
+import bisect
+
+REGISTRY = []
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._children = {}
+        REGISTRY.append(self)
+
+    def child(self, *label_values):
+        """Return the metric of the given label values, created on first use.
+        A child must only be updated by one thread."""
+        child = self._children.get(label_values)
+        if child is None:
+            child = self._children.setdefault(label_values, self._new_child())
+        return child
+
+    def _series(self):
+        if not self.labels:
+            return [((), self)]
+        return list(self._children.items())
+
+
+class Counter(Metric):
+    def __init__(self, name, help, labels=()):
+        Metric.__init__(self, name, help, labels)
+        self.value = 0
+
+    def _new_child(self):
+        child = Counter.__new__(Counter)
+        child.value = 0
+        return child
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, counter in self._series():
+            yield f"{self.name}{format_labels(self.labels, label_values)} {counter.value}"
+
+
+class Histogram(Metric):
+    def __init__(self, name, help, buckets, labels=()):
+        Metric.__init__(self, name, help, labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self):
+        child = Histogram.__new__(Histogram)
+        child.buckets = self.buckets
+        child.counts = [0] * (len(self.buckets) + 1)
+        child.sum = 0.0
+        return child
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, histogram in self._series():
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(histogram.counts)):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labels, label_values, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {total}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {histogram.sum}"
+            yield f"{self.name}_count{labels} {total}"
+
+
+class Gauge:
+    """Value computed when the metrics are rendered: func returns a number,
+    or a dict of label value to number if label is given"""
+
+    def __init__(self, name, help, func, label=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.label = label
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        if self.label is None:
+            yield f"{self.name} {self.func()}"
+        else:
+            for label_value, value in self.func().items():
+                yield f'{self.name}{{{self.label}="{label_value}"}} {value}'
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
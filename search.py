@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import array
+import bisect
+import re
+import threading
+
+re_token = re.compile(r"\[[A-Za-z_]+\]|[A-Za-z_][A-Za-z0-9_+\-]*:?")
+
+
+def tokenize(line):
+    """Words of a line after its "[ticks] " header: tags ("CC:"), names
+    (FSM_QSO, CAPA) and markers ([HOHO]). Numbers are not indexed."""
+    start = line.find("] ")
+    if line.startswith("[") and start > 0:
+        line = line[start + 2:]
+    return set(token.lower() for token in re_token.findall(line))
+
+
+class Postings:
+    """Sorted sequence numbers of the lines containing a token, expired ones
+    are dropped from the head like in History"""
+
+    def __init__(self):
+        self.seqs = array.array('q')
+        self.head = 0
+
+    def __len__(self):
+        return len(self.seqs) - self.head
+
+    def prune(self, min_seq):
+        self.head = bisect.bisect_left(self.seqs, min_seq, self.head)
+        if self.head > 256 and self.head * 2 > len(self.seqs):
+            del self.seqs[:self.head]
+            self.head = 0
+
+    def contains(self, seq):
+        i = bisect.bisect_left(self.seqs, seq, self.head)
+        return i < len(self.seqs) and self.seqs[i] == seq
+
+    def iter_from(self, seq):
+        i = bisect.bisect_left(self.seqs, seq, self.head)
+        while i < len(self.seqs):
+            yield self.seqs[i]
+            i += 1
+
+
+class SearchIndex:
+    """Inverted index from tokens to the sequence numbers of the history
+    lines containing them, maintained as lines are appended. Expired lines
+    are pruned from all the lists every PRUNE_INTERVAL lines, and from the
+    lists used by a search."""
+
+    PRUNE_INTERVAL = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._min_seq = 0
+        self._since_prune = 0
+
+    def add(self, seq, lines, min_seq):
+        """Index lines, the first one having sequence number seq. Lines
+        before min_seq have expired from the history."""
+        with self._lock:
+            for line in lines:
+                for token in tokenize(line):
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = Postings()
+                    postings.seqs.append(seq)
+                seq += 1
+
+            self._min_seq = min_seq
+            self._since_prune += len(lines)
+            if self._since_prune >= self.PRUNE_INTERVAL:
+                self._since_prune = 0
+                for token, postings in list(self._postings.items()):
+                    postings.prune(min_seq)
+                    if not postings:
+                        del self._postings[token]
+
+    def search(self, query, since_seq=0, limit=None):
+        """Return the sequence numbers of the lines containing all the words
+        of the query, from since_seq on"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            lists = []
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    return []
+                postings.prune(self._min_seq)
+                lists.append(postings)
+
+            # Walk the shortest list and look the others up
+            lists.sort(key=len)
+            result = []
+            for seq in lists[0].iter_from(since_seq):
+                if all(p.contains(seq) for p in lists[1:]):
+                    result.append(seq)
+                    if limit is not None and len(result) >= limit:
+                        break
+            return result
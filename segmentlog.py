@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+import metrics
+
+INDEX_ENTRY = struct.Struct('<dQ')
+
+lines_dropped = metrics.Counter("glutte_log_lines_dropped_total",
+                                "Lines not logged because too many were waiting to be written (LOG_MAX_PENDING)",
+                                ("source",))
+
+
+class Segment:
+    """One file of the log, with its sparse index of (timestamp, offset)
+    points. Segments are named after the timestamp of their first line."""
+
+    def __init__(self, directory, start):
+        self.start = start
+        name = "{:016d}".format(int(start * 1000))
+        self.log_path = os.path.join(directory, name + ".log")
+        self.idx_path = os.path.join(directory, name + ".idx")
+
+    def read_index(self):
+        try:
+            with open(self.idx_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], []
+
+        data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+        points = list(INDEX_ENTRY.iter_unpack(data))
+        return [p[0] for p in points], [p[1] for p in points]
+
+    def iter_range(self, since, until):
+        offset = 0
+        if since is not None:
+            timestamps, offsets = self.read_index()
+            i = bisect.bisect_left(timestamps, since)
+            if i > 0:
+                offset = offsets[i - 1]
+
+        try:
+            with open(self.log_path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError is raised for empty files, which cannot be mapped
+            return
+
+        try:
+            while True:
+                end = mm.find(b"\n", offset)
+                if end < 0:
+                    # Ignore a line that is still being written
+                    break
+                ts, _, line = mm[offset:end].partition(b" ")
+                offset = end + 1
+
+                ts = float(ts)
+                if until is not None and ts >= until:
+                    break
+                if since is None or ts >= since:
+                    yield ts, line.decode('ascii')
+        finally:
+            mm.close()
+
+    def remove(self):
+        for path in (self.log_path, self.idx_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class SegmentLog(threading.Thread):
+    """Append-only log of the received lines, split in segment files that are
+    rotated by size and age, and deleted after the retention period.
+
+    The serial thread only queues entries with append(), they are written and
+    fsync'd by this thread every flush_interval seconds. If writing fails, the
+    error is logged and retried at the next flush, and once max_pending
+    entries are waiting the oldest ones are dropped."""
+
+    INDEX_INTERVAL = 64 * 1024
+
+    def __init__(self, directory, segment_max_bytes, segment_max_age, retention, flush_interval,
+                 max_pending=None, source="default"):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.retention = retention
+        self.flush_interval = flush_interval
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segments = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".log"):
+                self._segments.append(Segment(directory, int(name[:-4]) / 1000))
+
+        self._pending = collections.deque(maxlen=max_pending)
+        self._lines_dropped = lines_dropped.child(source)
+        self._event_stop = threading.Event()
+        self._failing = False
+
+        self._current = None
+        self._log_file = None
+        self._idx_file = None
+        self._last_index_offset = 0
+
+    def append(self, entries):
+        pending = self._pending
+        if pending.maxlen is not None:
+            # The deque drops the oldest entries itself
+            excess = len(pending) + len(entries) - pending.maxlen
+            if excess > 0:
+                self._lines_dropped.inc(excess)
+        pending.extend(entries)
+
+    def run(self):
+        while not self._event_stop.wait(self.flush_interval):
+            self._try_flush()
+        self._try_flush()
+        self._close_segment()
+
+    def _try_flush(self):
+        try:
+            self.flush()
+        except OSError as e:
+            if not self._failing:
+                print("Could not write the log to {}: {}".format(self.directory, e))
+            self._failing = True
+        else:
+            if self._failing:
+                print("Writing the log to {} again".format(self.directory))
+            self._failing = False
+
+    def stop(self):
+        self._event_stop.set()
+        self.join()
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        while self._pending:
+            ts, line = self._pending.popleft()
+            try:
+                if self._needs_rotation(ts):
+                    self._close_segment()
+                    self._open_segment(ts)
+
+                offset = self._log_file.tell()
+                if offset == 0 or offset - self._last_index_offset >= self.INDEX_INTERVAL:
+                    self._idx_file.write(INDEX_ENTRY.pack(ts, offset))
+                    self._last_index_offset = offset
+
+                self._log_file.write("{:.6f} {}\n".format(ts, line).encode('ascii'))
+            except OSError:
+                # Retried at the next flush
+                self._pending.appendleft((ts, line))
+                raise
+
+        for f in (self._log_file, self._idx_file):
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._expire()
+
+    def iter_range(self, since=None, until=None):
+        with self._lock:
+            segments = list(self._segments)
+
+        for i, segment in enumerate(segments):
+            if until is not None and segment.start >= until:
+                break
+            if since is not None and i + 1 < len(segments) and segments[i + 1].start <= since:
+                continue
+            yield from segment.iter_range(since, until)
+
+    def _needs_rotation(self, ts):
+        if self._current is None:
+            return True
+        return self._log_file.tell() >= self.segment_max_bytes or \
+                ts - self._current.start >= self.segment_max_age
+
+    def _open_segment(self, ts):
+        segment = Segment(self.directory, ts)
+        self._log_file = open(segment.log_path, 'ab')
+        self._idx_file = open(segment.idx_path, 'ab')
+        self._last_index_offset = 0
+        self._current = segment
+
+        with self._lock:
+            if not self._segments or self._segments[-1].log_path != segment.log_path:
+                self._segments.append(segment)
+
+    def _close_segment(self):
+        if self._current is not None:
+            self._log_file.close()
+            self._idx_file.close()
+            self._current = None
+
+    def _expire(self):
+        limit = time.time() - self.retention
+        with self._lock:
+            # A segment can only go once the following one starts before the limit
+            expired = 0
+            while expired + 1 < len(self._segments) and self._segments[expired + 1].start < limit:
+                expired += 1
+            removed = self._segments[:expired]
+            del self._segments[:expired]
+
+        for segment in removed:
+            segment.remove()
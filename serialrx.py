@@ -25,173 +25,556 @@
 import serial
 import threading
 import collections
+import hashlib
+import itertools
+import json
+import math
 import re
 import time
-import datetime
 
-import config
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 
-re_cc_capa = re.compile(r"\[\d+\] CC: CAPA,(\d+),(\d+)")
-re_cc_vbat_plus = re.compile(r"\[\d+\] CC: VBAT\+,\d+,(\d+)")
-re_num_sv = re.compile(r"\[\d+\] T_GPS.+ (\d+) SV tracked")
-re_alim = re.compile(r"\[(\d+)\] ALIM (\d+) mV")
-re_temp = re.compile(r"\[\d+\] TEMP ([+-]?[0-9.]+)")
-re_relay = re.compile(r"\[\d+\] CC: RELAY,\d+,(On|Off),(On|Off),(On|Off)")
-re_deriv_delta = re.compile(r"\[\d+\] DERIV TS=.* Delta=(-?\d+)")
+import config
+import metrics
+from fsmstats import FsmStats
+from history import History
+from search import SearchIndex
+from segmentlog import SegmentLog
+from timeseries import MetricStore
+
+# Parsers for the telemetry values, by tag: the word that follows the
+# "[ticks] " header of a line. See register_parser().
+PARSERS = {}
+# Default value and timeout (after which it is considered stale) of each field
+FIELDS = {}
+
+# Labelled by source, as every source is read from its own thread (or from
+# the shared sources.Scheduler thread)
+bytes_read = metrics.Counter("glutte_serial_bytes_read_total", "Bytes read from the serial port", ("source",))
+lines_read = metrics.Counter("glutte_serial_lines_read_total", "Lines received", ("source",))
+decode_errors = metrics.Counter("glutte_serial_decode_errors_total", "Lines dropped because of invalid ASCII bytes",
+                                ("source",))
+parser_hits = metrics.Counter("glutte_parser_hits_total", "Lines matched by each parser", ("source", "parser"))
+parse_time = metrics.Histogram("glutte_parse_batch_seconds", "Time to parse a batch of received lines",
+                               (0.00001, 0.00003, 0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1), ("source",))
+lines_dropped = metrics.Counter("glutte_client_lines_dropped_total",
+                                "Lines dropped from the queue of slow clients (LINES_TO_KEEP)", ("source",))
+
+def register_parser(tag, pattern, fields, extract):
+    """Parse the lines with the given tag: pattern is matched against the rest
+    of the line, and extract(ticks, match) returns a dict with the new values
+    of the fields. fields gives the default value and timeout of the fields
+    this parser sets."""
+    PARSERS.setdefault(tag, []).append((re.compile(pattern), extract, ",".join(fields)))
+    FIELDS.update(fields)
+
+register_parser("CC:", r"CAPA,(\d+),(\d+)",
+                {"capa": (0, 60), "cc_uptime": (0, 60)},
+                lambda ticks, m: {"cc_uptime": int(m.group(1)), "capa": int(m.group(2))})
+register_parser("CC:", r"VBAT\+,\d+,(\d+)",
+                {"vbat_plus": (0, 60)},
+                lambda ticks, m: {"vbat_plus": int(m.group(1))})
+register_parser("CC:", r"RELAY,\d+,(On|Off),(On|Off),(On|Off)",
+                {"relay": ((False, False, False), 60)},
+                lambda ticks, m: {"relay": (m.group(1) == "On", m.group(2) == "On", m.group(3) == "On")})
+register_parser("T_GPS", r".+ (\d+) SV tracked",
+                {"num_sv": (0, 60)},
+                lambda ticks, m: {"num_sv": int(m.group(1))})
+# Convert milliseconds to seconds so that we have consistent units between the two uptimes
+register_parser("ALIM", r"(\d+) mV",
+                {"alim": (0, 60), "uptime": (0, 60)},
+                lambda ticks, m: {"uptime": int(int(ticks) / 1000), "alim": int(m.group(1))})
+register_parser("TEMP", r"([+-]?[0-9.]+)",
+                {"temp": (0, 60)},
+                lambda ticks, m: {"temp": float(m.group(1))})
+register_parser("DERIV", r"TS=.* Delta=(-?\d+)",
+                {"deriv_delta": (0, 3800)},
+                lambda ticks, m: {"deriv_delta": int(m.group(1))})
+
+class LineFramer:
+    """Split a stream of bytes read from the serial port into lines.
+
+    Data is accumulated in a reusable bytearray, and every call to feed()
+    returns all the lines completed by the new data at once, decoded and
+    with their trailing newline."""
+
+    def __init__(self, source="default"):
+        self._buf = bytearray()
+        self._decode_errors = decode_errors.child(source)
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+
+        end = buf.rfind(b"\n") + 1
+        if end == 0:
+            return []
+
+        chunk = bytes(buf[:end])
+        del buf[:end]
 
-class MessageParser:
-    def __init__(self):
+        try:
+            text = chunk.decode('ascii')
+        except UnicodeDecodeError:
+            return self._decode_lines(chunk)
+
+        return [line + "\n" for line in text[:-1].split("\n")]
+
+    def _decode_lines(self, chunk):
+        lines = []
+        for raw in chunk[:-1].split(b"\n"):
+            try:
+                lines.append(raw.decode('ascii') + "\n")
+            except UnicodeDecodeError:
+                self._decode_errors.inc()
+                print(f"Ignoring line with invalid ASCII bytes {raw}")
+        return lines
+
+# Longest regex accepted by LineFilter
+MAX_FILTER_REGEX = 100
+
+REPEATS = tuple(getattr(sre_parse, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                if hasattr(sre_parse, name))
+
+def check_regex(parsed, repeated=False):
+    """Raise re.error for the constructs that can backtrack exponentially:
+    repeats, alternatives and backreferences inside a repeat"""
+    for op, av in parsed:
+        if op in REPEATS:
+            low, high, item = av
+            if repeated and high > 1:
+                raise re.error("nested repeats are not allowed")
+            check_regex(item, repeated or high > 1)
+        elif op in (sre_parse.BRANCH, sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS) and repeated:
+            raise re.error("alternatives and backreferences are not allowed in a repeat")
+        else:
+            for arg in av if isinstance(av, (tuple, list)) else (av,):
+                if isinstance(arg, sre_parse.SubPattern):
+                    check_regex(arg, repeated)
+                elif isinstance(arg, list):
+                    for sub in arg:
+                        if isinstance(sub, sre_parse.SubPattern):
+                            check_regex(sub, repeated)
+
+class LineFilter:
+    """Select lines by tag (what follows the "[ticks] " header, e.g. "FSM:"
+    or "CC: CAPA") and/or by regex. Filters built from the same tags and
+    regex have the same key, so that their clients can share the filtering.
+
+    The regex runs on every received line, in the thread reading the port.
+    It is limited to MAX_FILTER_REGEX characters and to the constructs
+    without exponential backtracking (see check_regex), which still leaves
+    slow patterns possible: regex filters are meant for trusted clients."""
+
+    def __init__(self, tags=(), regex=None):
+        self.tags = tuple(sorted(set(tags)))
+        self.regex = None
+        if regex:
+            if len(regex) > MAX_FILTER_REGEX:
+                raise re.error("longer than {} characters".format(MAX_FILTER_REGEX))
+            check_regex(sre_parse.parse(regex))
+            self.regex = re.compile(regex)
+        self.key = (self.tags, regex or None)
+
+    def match(self, line):
+        if self.tags and not line.partition("] ")[2].startswith(self.tags):
+            return False
+        if self.regex is not None and self.regex.search(line) is None:
+            return False
+        return True
+
+def select_lines(line_filter, lines):
+    if line_filter is None:
+        return lines
+    return [line for line in lines if line_filter.match(line)]
+
+class Subscriber(collections.deque):
+    """Queue of lines for one client of SerialRX. The event is set whenever
+    lines are pushed, so that the client can block until there is something
+    to read and then drain everything at once. next_seq is the sequence
+    number following the last batch pushed: lines skipped by the filter
+    after it only advance next_seq with the next batch that has a match.
+    start_seq is the sequence number of the first line it can get, taken
+    when it was registered, for the client to replay the history up to it.
+    kind tells the /stream clients ("stream") from the internal ones (e.g.
+    "monitor" or "broker") in the metrics."""
+
+    def __init__(self, max_lines, seq, line_filter=None, wakeup=None, source="default", kind="internal"):
+        collections.deque.__init__(self)
+        self.kind = kind
+        self.max_lines = max_lines
+        self.line_filter = line_filter
+        self.start_seq = seq
+        self.next_seq = seq
+        self.dropped = 0
+        self.closed = False
+        self.event = threading.Event()
+        # Also set on push, for a thread that waits for several subscribers
+        self.wakeup = wakeup
         self._lock = threading.Lock()
+        self._lost = 0
+        self._lines_dropped = lines_dropped.child(source)
 
-        self._last_timestamp = 0
-        self._last_timestamp_time = 0
-        self._last_cc_timestamp = 0
-        self._last_cc_timestamp_time = 0
-        self._last_cc_capa = 0
-        self._last_cc_capa_time = 0
-        self._last_vbat_plus = 0
-        self._last_vbat_plus_time = 0
-        self._last_num_sv = 0
-        self._last_num_sv_time = 0
-        self._last_alim = 0
-        self._last_alim_time = 0
-        self._last_temp = 0
-        self._last_temp_time = 0
-        self._last_relay = (False, False, False)
-        self._last_relay_time = 0
-        self._last_deriv_delta = 0
-        self._last_deriv_delta_time = 0
-
-    def parse_message(self, message):
+    def push(self, lines, next_seq):
         with self._lock:
-            match = re_cc_capa.search(message)
-            if match:
-                self._last_cc_timestamp = int(match.group(1))
-                self._last_cc_capa = int(match.group(2))
-                self._last_cc_timestamp_time = \
-                    self._last_cc_capa_time = time.time()
+            self.extend(lines)
+            self.next_seq = next_seq
+
+            while len(self) > self.max_lines:
+                self.popleft()
+                self.dropped += 1
+                self._lost += 1
+                self._lines_dropped.inc()
+
+        self.event.set()
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def wait(self, timeout=None):
+        return self.event.wait(timeout)
+
+    def drain(self):
+        """Return (lines, next_seq, lost) with all the pending lines, the
+        sequence number that follows them and the number of lines dropped
+        since the previous call"""
+        # Clear first so that lines pushed while draining set it again
+        self.event.clear()
+        with self._lock:
+            lines = list(self)
+            self.clear()
+            lost = self._lost
+            self._lost = 0
+            return lines, self.next_seq, lost
 
-            match = re_cc_vbat_plus.search(message)
-            if match:
-                self._last_vbat_plus = int(match.group(1))
-                self._last_vbat_plus_time = time.time()
+    def close(self):
+        self.closed = True
+        self.event.set()
 
-            match = re_num_sv.search(message)
+class MessageParser:
+    """Extract the telemetry values from the lines, using the parsers
+    registered for their tag.
+
+    Only the serial thread parses messages, and it replaces the dict of values
+    instead of modifying it, so readers get a consistent snapshot without
+    taking a lock.
+
+    If a MetricStore is given, the numeric values are also recorded in it, and
+    if a FsmStats is given, the FSM transitions are fed to it.
+
+    version is incremented whenever the values change, see stats() and
+    wait_change()."""
+
+    def __init__(self, store=None, fsm=None, source="default"):
+        self.store = store
+        self.fsm = fsm
+        self.source = source
+        # Counter of each parser, by parser name
+        self._hits = {}
+        self._values = {name: (default, 0) for name, (default, _) in FIELDS.items()}
+        self.version = 0
+        # Replaced and set on every change, to wake up the waiters
+        self._changed = threading.Event()
+        # (version, expiry, etag, body) of the last stats()
+        self._stats = None
+
+    def _set_values(self, values):
+        self._values = values
+        self.version += 1
+        changed = self._changed
+        self._changed = threading.Event()
+        changed.set()
+
+    def parse_message(self, message, now=None):
+        if self.fsm is not None and message.rstrip().endswith("common init"):
+            self.fsm.reset(time.time() if now is None else now)
+            return
+
+        start = message.find("[")
+        end = message.find("] ", start)
+        if start < 0 or end < 0:
+            return
+
+        ticks = message[start + 1:end]
+        if not ticks.isdigit():
+            return
+
+        tag, _, rest = message[end + 2:].partition(" ")
+
+        if self.fsm is not None and tag == "FSM:" and rest.startswith("FSM_"):
+            self.fsm.transition(time.time() if now is None else now, rest.strip())
+            return
+
+        parsers = PARSERS.get(tag)
+        if parsers is None:
+            return
+
+        for regex, extract, name in parsers:
+            match = regex.match(rest)
             if match:
-                self._last_num_sv = int(match.group(1))
-                self._last_num_sv_time = time.time()
+                hits = self._hits.get(name)
+                if hits is None:
+                    hits = self._hits[name] = parser_hits.child(self.source, name)
+                hits.inc()
+                if now is None:
+                    now = time.time()
+
+                values = dict(self._values)
+                for name, value in extract(ticks, match).items():
+                    values[name] = (value, now)
+                    if self.store is not None and type(value) in (int, float):
+                        self.store.add(name, now, value)
+                self._set_values(values)
+                return
+
+    def snapshot(self):
+        return {name: [value, ts] for name, (value, ts) in self._values.items()}
+
+    def restore(self, values):
+        """Restore the values returned by snapshot(), unless they are older
+        than the current ones. The ones older than their timeout will read as
+        stale as usual."""
+        restored = dict(self._values)
+        for name, (value, ts) in values.items():
+            if name in FIELDS and ts > restored[name][1]:
+                # JSON turns the tuples into lists
+                restored[name] = (tuple(value) if type(value) is list else value, ts)
+        self._set_values(restored)
+
+    def stats(self, now=None):
+        """Return (etag, body, expiry) of the JSON object of the values, with
+        null for the stale ones. The body is only rebuilt when the values
+        changed or one of them became stale, which happens at expiry. The
+        etag only depends on the body."""
+        if now is None:
+            now = time.time()
+
+        cached = self._stats
+        if cached is not None and cached[0] == self.version and now <= cached[1]:
+            return cached[2], cached[3], cached[1]
+
+        version = self.version
+        out = {}
+        expiry = math.inf
+        for name, (value, ts) in self._values.items():
+            stale_at = ts + FIELDS[name][1]
+            if stale_at < now:
+                out[name] = None
+            else:
+                out[name] = value
+                expiry = min(expiry, stale_at)
+
+        body = json.dumps(out, sort_keys=True).encode()
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        self._stats = (version, expiry, etag, body)
+        return etag, body, expiry
+
+    def wait_change(self, version, timeout=None):
+        """Wait until the values change from the given version, return
+        whether they did"""
+        changed = self._changed
+        if self.version != version:
+            return True
+        return changed.wait(timeout)
 
-            match = re_alim.search(message)
-            if match:
-                # Convert milliseconds to seconds so that we have consistent units between the two uptimes
-                self._last_timestamp = int(int(match.group(1)) / 1000)
-                self._last_alim = int(match.group(2))
-                self._last_timestamp_time = \
-                    self._last_alim_time = time.time()
+    def get_last_data(self):
+        values = self._values
+        return {name: (value, ts, FIELDS[name][1]) for name, (value, ts) in values.items()}
 
-            match = re_temp.search(message)
-            if match:
-                self._last_temp = float(match.group(1))
-                self._last_temp_time = time.time()
+class SerialRX(threading.Thread):
+    """Read the lines from the serial port, or from the given transport, which
+    must provide the read() and in_waiting of serial.Serial (see
+    simulator.SimulatedSerial). The port, baudrate and log directory default
+    to the ones of the config. source is the name of the source, used as
+    label of its metrics.
 
-            match = re_relay.search(message)
-            if match:
-                self._last_relay = (match.group(1) == "On", match.group(2) == "On", match.group(3) == "On")
-                self._last_relay_time = time.time()
+    The thread reads this port only, see sources.Scheduler to read several
+    ports from one thread."""
 
-            match = re_deriv_delta.search(message)
-            if match:
-                self._last_deriv_delta = int(match.group(1))
-                self._last_deriv_delta_time = time.time()
+    def __init__(self, transport=None, port=None, baudrate=None, log_dir=None, source="default"):
+        threading.Thread.__init__(self)
 
-    def get_last_data(self):
-        with self._lock:
-            return {"capa": (self._last_cc_capa, self._last_cc_capa_time, 60),
-                    "vbat_plus": (self._last_vbat_plus, self._last_vbat_plus_time, 60),
-                    "alim": (self._last_alim, self._last_alim_time, 60),
-                    "num_sv": (self._last_num_sv, self._last_num_sv_time, 60),
-                    "temp": (self._last_temp, self._last_temp_time, 60),
-                    "relay": (self._last_relay, self._last_relay_time, 60),
-                    "deriv_delta": (self._last_deriv_delta, self._last_deriv_delta_time, 3800),
-                    "cc_uptime": (self._last_cc_timestamp, self._last_cc_timestamp_time, 60),
-                    "uptime": (self._last_timestamp, self._last_timestamp_time, 60)}
+        self.source = source
+        self._transport = transport
+        self.port = config.SERIALPORT if port is None else port
+        self.baudrate = config.BAUDRATE if baudrate is None else baudrate
+        self.log_dir = config.LOG_DIR if log_dir is None else log_dir
 
-class SerialRX(threading.Thread):
-    def __init__(self):
-        threading.Thread.__init__(self)
+        self.metrics = MetricStore(config.TIMESERIES_RAW_CAPACITY, config.TIMESERIES_MINUTE_CAPACITY,
+                                   config.TIMESERIES_HOUR_CAPACITY)
+        self.fsm = FsmStats(config.FSM_STATS_WINDOWS, config.FSM_TIMELINE_LENGTH)
+        self._parser = MessageParser(self.metrics, self.fsm, source)
 
-        self._parser = MessageParser()
+        self._bytes_read = bytes_read.child(source)
+        self._lines_read = lines_read.child(source)
+        self._parse_time = parse_time.child(source)
 
-        print("Open Serial on {} at {}".format(config.SERIALPORT, config.BAUDRATE))
-        self.ser = serial.Serial(config.SERIALPORT, baudrate=config.BAUDRATE)
+        self.ser = self._open()
 
         self.event_stop = threading.Event()
 
         self.data_lock = threading.Lock()
         self.clients = []
+        # Clients grouped by filter key, each group is [filter, [clients]]
+        self.client_groups = {}
+
+        self.cache = History(config.CACHE_MAX_AGE, max_bytes=config.CACHE_MAX_BYTES, hot_lines=config.CACHE_HOT_LINES)
+        # Sequence numbers are only valid for a given epoch, i.e. until restart
+        self.epoch = int(time.time() * 1000)
 
-        self.line_accumulator = []
-        self.last_lines = []
+        self.index = SearchIndex() if config.SEARCH_INDEX else None
 
-        self.cache = [] # contains [ { 'ts': 'TIMESTAMP', 'line': 'LINE' }, ... ]
+        self.log = self._open_log()
+        if self.log is not None:
+            self.cache.extend(self.log.iter_range(time.time() - config.CACHE_MAX_AGE))
+            for ts, line in self.cache:
+                self._parser.parse_message(line, ts)
+            if self.index is not None:
+                self.index.add(self.cache.first_seq, [line for _, line in self.cache], self.cache.first_seq)
+            print("Loaded {} lines of history from {}".format(len(self.cache), self.log_dir))
 
         print("Serial port ready")
 
+    def _open(self):
+        if self._transport is not None:
+            return self._transport
+
+        print("Open Serial on {} at {}".format(self.port, self.baudrate))
+        return serial.Serial(self.port, baudrate=self.baudrate)
+
+    def _open_log(self):
+        if not self.log_dir:
+            return None
+        return SegmentLog(self.log_dir, config.LOG_SEGMENT_MAX_BYTES, config.LOG_SEGMENT_MAX_AGE,
+                          config.LOG_RETENTION, config.LOG_FLUSH_INTERVAL, config.LOG_MAX_PENDING, self.source)
+
     def get_cache(self):
         return self.cache
 
+    def iter_history(self, since=None, until=None, last=None):
+        """Iterate over the history, reading the part older than the
+        in-memory cache from the on-disk log if there is one"""
+        if last is not None and last < 0:
+            raise ValueError("last must not be negative")
+
+        oldest = self.cache.oldest()
+        if self.log is None or since is None or (oldest is not None and since >= oldest):
+            return self.cache.iter_range(since, until, last)
+
+        disk_until = oldest
+        if until is not None and (oldest is None or until < oldest):
+            disk_until = until
+
+        entries = itertools.chain(self.log.iter_range(since, disk_until), self.cache.iter_range(since, until))
+        if last is not None:
+            entries = collections.deque(entries, maxlen=last)
+        return entries
+
     def get_parsed_values(self):
         return self._parser.get_last_data()
 
+    def get_parser(self):
+        return self._parser
+
+    def get_metrics(self):
+        return self.metrics
+
+    def get_index(self):
+        return self.index
+
+    def get_fsm_stats(self):
+        return self.fsm
+
     def run(self):
         print("Serial port starting reception")
+        framer = LineFramer(self.source)
         while not self.event_stop.is_set():
-            databyte = self.ser.read()
-            self.line_accumulator.append(databyte)
-
-            if databyte == b"\n":
-                try:
-                    line = b"".join(self.line_accumulator).decode('ascii')
-                    self._parser.parse_message(line)
-                    now = datetime.datetime.utcnow()
-                    max_age = datetime.timedelta(seconds=config.CACHE_MAX_AGE)
-
-                    self.cache = [h for h in self.cache if h['ts'] + max_age > now]
-                    self.cache.append({'ts': now, 'line': line.strip()})
-
-                    self.data_lock.acquire()
-                    try:
-                        for queue in self.clients:
-                            queue.append(line)
-
-                            if len(queue) > config.LINES_TO_KEEP:
-                                queue.popleft()
-
-                        self.last_lines.append(line)
-
-                        if len(self.last_lines) > config.LAST_LINE_TO_KEEP:
-                            self.last_lines.pop(0)
-                    except:
-                        raise
-                    finally:
-                        self.data_lock.release()
-                    self.line_accumulator = []
-                except UnicodeDecodeError:
-                    print(f"Ignoring line with invalid ASCII bytes {self.line_accumulator}")
-                    self.line_accumulator = []
+            self.read_available(framer)
+
+    def read_available(self, framer):
+        # Block for at least one byte, then take everything already waiting
+        data = self.ser.read(self.ser.in_waiting or 1)
+        self._bytes_read.inc(len(data))
+        lines = framer.feed(data)
+        if lines:
+            self._process_lines(lines)
+
+    def _process_lines(self, lines):
+        now = time.time()
+        self._ingest([(now, line) for line in lines])
+
+    def _ingest(self, received):
+        """Handle a batch of (timestamp, line) received lines, the lines
+        ending with their newline"""
+        self._lines_read.inc(len(received))
+
+        t_start = time.perf_counter()
+        for ts, line in received:
+            self._parser.parse_message(line, ts)
+        self._parse_time.observe(time.perf_counter() - t_start)
+
+        entries = [(ts, line.strip()) for ts, line in received]
+        lines = [line for _, line in received]
+        if self.log is not None:
+            self.log.append(entries)
+
+        # Filter outside of the lock, so that a slow regex does not hold up
+        # the other clients and the readers of the history
+        self.data_lock.acquire()
+        try:
+            groups = list(self.client_groups.items())
+        finally:
+            self.data_lock.release()
+        selections = {key: select_lines(line_filter, lines) for key, (line_filter, _) in groups}
+
+        self.data_lock.acquire()
+        try:
+            # Under the lock, so that the sequence numbers of the history match
+            # what the clients get
+            self.cache.expire(received[-1][0])
+            first_seq = self.cache.next_seq
+            self.cache.extend(entries)
+            if self.index is not None:
+                self.index.add(first_seq, [line for _, line in entries], self.cache.first_seq)
+
+            next_seq = self.cache.next_seq
+            for key, (line_filter, clients) in self.client_groups.items():
+                selected = selections.get(key)
+                if selected is None:
+                    # Group created while filtering
+                    selected = select_lines(line_filter, lines)
+                if selected:
+                    for client in clients:
+                        client.push(selected, next_seq)
+        except:
+            raise
+        finally:
+            self.data_lock.release()
+
+    def start(self):
+        if self.log is not None:
+            self.log.start()
+        threading.Thread.start(self)
 
     def stop(self):
         self.event_stop.set()
         self.join()
+        if self.log is not None:
+            self.log.stop()
 
-    def get_last_lines(self):
-        return self.last_lines
-
-    def register_client(self):
+    def register_client(self, line_filter=None, wakeup=None, kind="internal"):
+        """Return a new Subscriber, its start_seq being taken under the lock
+        like the sequence numbers of the lines pushed to it"""
         self.data_lock.acquire()
         try:
-            new_queue = collections.deque()
+            new_queue = Subscriber(config.LINES_TO_KEEP, self.cache.next_seq, line_filter, wakeup, self.source, kind)
             self.clients.append(new_queue)
+
+            key = None if line_filter is None else line_filter.key
+            group = self.client_groups.setdefault(key, [line_filter, []])
+            group[1].append(new_queue)
         except:
             raise
         finally:
@@ -203,43 +586,52 @@ class SerialRX(threading.Thread):
         self.data_lock.acquire()
         try:
             self.clients = [x for x in self.clients if id(x) != id(queue)]
+
+            key = None if queue.line_filter is None else queue.line_filter.key
+            group = self.client_groups.get(key)
+            if group is not None:
+                group[1] = [x for x in group[1] if id(x) != id(queue)]
+                if not group[1]:
+                    del self.client_groups[key]
         except:
             raise
         finally:
             self.data_lock.release()
 
-if __name__ == "__main__":
-    test_set = """[193583144] CW: K
-    [193583168] In cw_done change 0 0
-    [193584056] FSM: FSM_ECOUTE
-    [193585992] In SQ 1
-    [193586008] FSM: FSM_QSO
-    [193592816] CC: CAPA,148111,1632707
-    [193605944] CC: CAPA,148121,1632682
-    [193605944] CC: VBAT+,148121,12340
-    [193605944] CC: VBAT-,148121,0
-    [193612144] ALIM 11811 mV
-    [193672600] T_GPS 2020-04-28 19:07:30 12 SV tracked
-    [193672656] TIME  2020-04-28 21:07:30 [GPS]
-    [233465736] TEMP 0.75
-    [193692528] TEMP invalid
-    [102976] CC: RELAY,721,On,Off,Off
-    [3470371128] DERIV TS=3470370904 Excepted=3470371680 Delta=776
-    """
-    test_should = {"capa": 1632682,
-                   "cc_uptime": 148121,
-                   "vbat_plus": 12340,
-                   "alim": 11811,
-                   "num_sv": 12,
-                   "temp": 0.75,
-                   "deriv_delta": 776,
-                   "uptime": int(int(193612144) / 1000),
-                   "relay": (True, False, False)}
 
+# Lines of each kind the parser knows, used for the self test and the benchmarks
+TEST_SET = """[193583144] CW: K
+[193583168] In cw_done change 0 0
+[193584056] FSM: FSM_ECOUTE
+[193585992] In SQ 1
+[193586008] FSM: FSM_QSO
+[193592816] CC: CAPA,148111,1632707
+[193605944] CC: CAPA,148121,1632682
+[193605944] CC: VBAT+,148121,12340
+[193605944] CC: VBAT-,148121,0
+[193612144] ALIM 11811 mV
+[193672600] T_GPS 2020-04-28 19:07:30 12 SV tracked
+[193672656] TIME  2020-04-28 21:07:30 [GPS]
+[233465736] TEMP 0.75
+[193692528] TEMP invalid
+[102976] CC: RELAY,721,On,Off,Off
+[3470371128] DERIV TS=3470370904 Excepted=3470371680 Delta=776
+"""
+TEST_SHOULD = {"capa": 1632682,
+               "cc_uptime": 148121,
+               "vbat_plus": 12340,
+               "alim": 11811,
+               "num_sv": 12,
+               "temp": 0.75,
+               "deriv_delta": 776,
+               "uptime": int(int(193612144) / 1000),
+               "relay": (True, False, False)}
+
+if __name__ == "__main__":
     mp = MessageParser()
 
     print("Testing parser")
-    for message in test_set.split("\n"):
+    for message in TEST_SET.split("\n"):
         print("Parse {}".format(message))
         mp.parse_message(message)
 
@@ -249,9 +641,9 @@ if __name__ == "__main__":
         if test_measured[k][1] == 0:
             print("Value {} has time 0".format(k))
 
-        if test_measured[k][0] == test_should[k]:
+        if test_measured[k][0] == TEST_SHOULD[k]:
             print(f"Value {k} ok")
         else:
-            print(f"Value {k} {test_measured[k][0]} not expected {test_should[k]}")
+            print(f"Value {k} {test_measured[k][0]} not expected {TEST_SHOULD[k]}")
 
     print("Test end")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Serial port simulator, to run and load-test the server without the board.
+# Lines come from a captured log (the raw UART output or a /history dump) or
+# from a synthetic generator, and are fed at a configurable rate and burst
+# size either through a pty:
+#
+#   python simulator.py --rate 50 --burst 10 [--log capture.txt]
+#
+# (then set SERIALPORT to the printed device), or in-process with
+# SimulatedSerial given as transport to serialrx.SerialRX.
+
+import argparse
+import itertools
+import os
+import random
+import re
+import threading
+import time
+import tty
+
+re_history_prefix = re.compile(r"^\d{4}-\d\d-\d\dT[0-9:.]+ ")
+
+
+def synthetic_lines(seed=0):
+    """Endless stream of lines of the kinds in serialrx.TEST_SET, with
+    varying values"""
+    rnd = random.Random(seed)
+    states = ["FSM_OISIF", "FSM_OPEN1", "FSM_OPEN2", "FSM_LETTRE", "FSM_ECOUTE", "FSM_QSO", "FSM_ATTENTE"]
+    templates = [
+        lambda: "CW: K",
+        lambda: "In cw_done change 0 0",
+        lambda: "FSM: {}".format(rnd.choice(states)),
+        lambda: "In SQ {}".format(rnd.randint(0, 1)),
+        lambda: "CC: CAPA,{},{}".format(ticks // 1000, rnd.randint(1500000, 1700000)),
+        lambda: "CC: VBAT+,{},{}".format(ticks // 1000, rnd.randint(11500, 13800)),
+        lambda: "CC: VBAT-,{},0".format(ticks // 1000),
+        lambda: "ALIM {} mV".format(rnd.randint(11000, 13500)),
+        lambda: "T_GPS 2020-04-28 19:07:30 {} SV tracked".format(rnd.randint(0, 14)),
+        lambda: "TIME  2020-04-28 21:07:30 [GPS]",
+        lambda: "TEMP {:.2f}".format(rnd.uniform(-15, 35)),
+        lambda: "CC: RELAY,{},{},{},{}".format(ticks // 1000, *(rnd.choice(["On", "Off"]) for _ in range(3))),
+        lambda: "DERIV TS={0} Excepted={0} Delta={1}".format(ticks, rnd.randint(-1000, 1000)),
+    ]
+
+    ticks = 0
+    while True:
+        ticks += rnd.randint(10, 5000)
+        yield "[{}] {}".format(ticks, rnd.choice(templates)())
+
+
+def replay_lines(path, loop=False):
+    """Lines of a captured log, either the raw UART output or a /history
+    dump, whose timestamps are removed"""
+    while True:
+        with open(path) as f:
+            for line in f:
+                yield re_history_prefix.sub("", line.rstrip("\r\n"))
+        if not loop:
+            return
+
+
+def paced(lines, rate=None, burst=1):
+    """Group lines in batches of `burst` lines, spaced so that on average
+    `rate` lines per second are produced (as fast as possible if None)"""
+    lines = iter(lines)
+    interval = burst / rate if rate else 0
+    next_time = time.monotonic()
+    while True:
+        batch = list(itertools.islice(lines, burst))
+        if not batch:
+            return
+        yield batch
+
+        if interval:
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def encode(batch):
+    return "".join(line + "\r\n" for line in batch).encode('ascii')
+
+
+class SimulatedSerial:
+    """In-process replacement for serial.Serial, fed by a thread with the
+    given lines"""
+
+    MAX_BUFFER = 1024 * 1024
+
+    def __init__(self, lines, rate=None, burst=1):
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+        self.done = threading.Event()
+
+        self._thread = threading.Thread(target=self._feed, args=(paced(lines, rate, burst),), daemon=True)
+        self._thread.start()
+
+    @property
+    def in_waiting(self):
+        return len(self._buf)
+
+    def read(self, size=1):
+        with self._cond:
+            self._cond.wait_for(lambda: self._buf)
+            data = bytes(self._buf[:size])
+            del self._buf[:size]
+            self._cond.notify_all()
+            return data
+
+    def _feed(self, batches):
+        for batch in batches:
+            data = encode(batch)
+            with self._cond:
+                # Unlike a real port, never lose data when the reader lags
+                self._cond.wait_for(lambda: len(self._buf) < self.MAX_BUFFER)
+                self._buf += data
+                self._cond.notify_all()
+        self.done.set()
+
+
+class PtySerial:
+    """Feed the lines to the master side of a pty, `port` is the device to
+    open as serial port. More lines can be written with write()."""
+
+    def __init__(self, lines=(), rate=None, burst=1):
+        self._master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.done = threading.Event()
+
+        self._thread = threading.Thread(target=self._feed, args=(paced(lines, rate, burst),), daemon=True)
+        self._thread.start()
+
+    def write(self, batch):
+        os.write(self._master, encode(batch))
+
+    def _feed(self, batches):
+        for batch in batches:
+            self.write(batch)
+        self.done.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the glutte serial port on a pty")
+    parser.add_argument("--log", help="captured log to replay, synthetic lines if not given")
+    parser.add_argument("--loop", action="store_true", help="replay the log forever")
+    parser.add_argument("--rate", type=float, default=10, help="lines per second, 0 for as fast as possible")
+    parser.add_argument("--burst", type=int, default=1, help="lines sent at once")
+    args = parser.parse_args()
+
+    lines = replay_lines(args.log, args.loop) if args.log else synthetic_lines()
+    sim = PtySerial(lines, args.rate or None, args.burst)
+    print("Simulated serial port on {}, set SERIALPORT to it".format(sim.port))
+
+    try:
+        sim.done.wait()
+    except KeyboardInterrupt:
+        pass
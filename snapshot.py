@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# Warm restarts: the parsed values, the state of the monitors and the alarms
+# already notified are saved periodically and on exit to SNAPSHOT_FILE, and
+# loaded back before the serial ports are read.
+
+import atexit
+import json
+import os
+import threading
+import time
+
+import adsl
+import config
+import serialrx
+
+
+class Snapshots(threading.Thread):
+    """Save the state of the given sources (a dict of SerialRX by name) and
+    of the ADSL, if any, every `interval` seconds and on exit"""
+
+    def __init__(self, path, sers, adsl=None, interval=60, max_age=3600):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.event_stop = threading.Event()
+        self._sers = sers
+        self._adsl = adsl
+
+    def load(self):
+        """Restore the last snapshot, unless it is older than max_age.
+        Returns the time of the snapshot, or None if nothing was restored."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print("Could not read snapshot {}: {}".format(self.path, e))
+            return None
+
+        try:
+            self._check(state)
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError) as e:
+            print("Ignoring malformed snapshot {}: {!r}".format(self.path, e))
+            return None
+
+        age = time.time() - state["time"]
+        if age > self.max_age:
+            print("Ignoring snapshot {} taken {} seconds ago".format(self.path, int(age)))
+            return None
+
+        for name, source in state["sources"].items():
+            ser = self._sers.get(name)
+            if ser is None:
+                continue
+            ser.get_parser().restore(source["values"])
+            if self._adsl is not None and "monitor" in source:
+                self._adsl.monitors.monitors[name].restore(source["monitor"])
+
+        if self._adsl is not None:
+            self._adsl.notified_alarms = state["notified_alarms"]
+            self._adsl.restored = state["time"]
+
+        print("Restored snapshot {} taken {} seconds ago".format(self.path, int(age)))
+        return state["time"]
+
+    def _check(self, state):
+        """Raise if the snapshot is malformed, by restoring it into scratch
+        objects first, so that load() restores all of it or nothing"""
+        if type(state["time"]) not in (int, float):
+            raise TypeError("time is not a number")
+        for source in state["sources"].values():
+            serialrx.MessageParser().restore(source["values"])
+            if self._adsl is not None and "monitor" in source:
+                adsl.Monitor(None, threading.Event()).restore(source["monitor"])
+        if self._adsl is not None and type(state["notified_alarms"]) is not list:
+            raise TypeError("notified_alarms is not a list")
+
+    def save(self):
+        sources = {}
+        for name, ser in self._sers.items():
+            sources[name] = {"values": ser.get_parser().snapshot()}
+            if self._adsl is not None:
+                sources[name]["monitor"] = self._adsl.monitors.monitors[name].snapshot()
+
+        state = {"time": time.time(), "sources": sources}
+        if self._adsl is not None:
+            state["notified_alarms"] = self._adsl.notified_alarms
+
+        # Replace the file at once so that a crash never leaves half of it
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def start(self):
+        atexit.register(self.stop)
+        threading.Thread.start(self)
+
+    def run(self):
+        while not self.event_stop.wait(self.interval):
+            try:
+                self.save()
+            except OSError as e:
+                print("Could not save snapshot {}: {}".format(self.path, e))
+
+    def stop(self):
+        if self.event_stop.is_set():
+            return
+        self.event_stop.set()
+        try:
+            self.save()
+        except OSError as e:
+            print("Could not save snapshot {}: {}".format(self.path, e))
+
+
+def open_snapshots(sers, adsl=None):
+    """Load the snapshot of config.SNAPSHOT_FILE and return the Snapshots to
+    start, or None if snapshots are disabled"""
+    if not config.SNAPSHOT_FILE:
+        return None
+    snapshots = Snapshots(config.SNAPSHOT_FILE, sers, adsl, config.SNAPSHOT_INTERVAL, config.SNAPSHOT_MAX_AGE)
+    snapshots.load()
+    return snapshots
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# The serial sources of config.SOURCES, each one with its own SerialRX, or a
+# single "default" source on SERIALPORT and BAUDRATE if it is empty.
+
+import os
+import selectors
+import threading
+
+import serial
+
+import config
+import metrics
+import serialrx
+
+
+def configured():
+    """Return the list of (name, port, baudrate) of the sources"""
+    if not config.SOURCES:
+        return [("default", config.SERIALPORT, config.BAUDRATE)]
+    return [(name, source["port"], source.get("baudrate", config.BAUDRATE))
+            for name, source in config.SOURCES.items()]
+
+def log_dir(name):
+    # With several sources, each one logs in its own subdirectory
+    if not config.LOG_DIR or not config.SOURCES:
+        return config.LOG_DIR
+    return os.path.join(config.LOG_DIR, name)
+
+def broker_path(name):
+    if not config.BROKER_SOCKET or not config.SOURCES:
+        return config.BROKER_SOCKET
+    return "{}.{}".format(config.BROKER_SOCKET, name)
+
+def open_sources():
+    """Open the serial port of every source, return their SerialRX by name"""
+    return {name: serialrx.SerialRX(port=port, baudrate=baudrate, log_dir=log_dir(name), source=name)
+            for name, port, baudrate in configured()}
+
+def register_gauges(sers, get_clients=None):
+    """Register the /metrics gauges of the sources (a dict of SerialRX by
+    name). get_clients(name) returns the queues of the stream clients of a
+    source, by default the /stream clients registered to its SerialRX, but
+    not the internal ones (Monitors, broker)."""
+    if get_clients is None:
+        get_clients = lambda name: [client for client in sers[name].clients if client.kind == "stream"]
+
+    metrics.Gauge("glutte_stream_clients", "Number of registered clients",
+                  lambda: {name: len(get_clients(name)) for name in sers}, "source")
+    metrics.Gauge("glutte_client_queue_depth", "Lines waiting in the queue of each client",
+                  lambda: {f"{name}/{i}": len(client) for name in sers for i, client in enumerate(get_clients(name))},
+                  "client")
+    metrics.Gauge("glutte_history_lines", "Lines in the history cache",
+                  lambda: {name: len(s.get_cache()) for name, s in sers.items()}, "source")
+    metrics.Gauge("glutte_history_bytes", "Approximate memory used by the history cache",
+                  lambda: {name: s.get_cache().memory() for name, s in sers.items()}, "source")
+
+
+class Scheduler(threading.Thread):
+    """Read the serial ports of several SerialRX from a single thread, which
+    waits until any of them has data. Sources whose transport has no file
+    descriptor to wait on (the simulated ones) run their own thread."""
+
+    def __init__(self, sers):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.event_stop = threading.Event()
+
+        self._selector = selectors.DefaultSelector()
+        self._own_thread = []
+        for ser in sers:
+            if hasattr(ser.ser, "fileno"):
+                self._selector.register(ser.ser.fileno(), selectors.EVENT_READ, (ser, serialrx.LineFramer(ser.source)))
+            else:
+                self._own_thread.append(ser)
+        self._scheduled = [key.data[0] for key in self._selector.get_map().values()]
+
+    def start(self):
+        for ser in self._scheduled:
+            if ser.log is not None:
+                ser.log.start()
+        for ser in self._own_thread:
+            ser.start()
+        if self._scheduled:
+            threading.Thread.start(self)
+
+    def run(self):
+        print("Reading {} serial port(s)".format(len(self._scheduled)))
+        while not self.event_stop.is_set():
+            for key, _ in self._selector.select(timeout=1):
+                ser, framer = key.data
+                try:
+                    ser.read_available(framer)
+                except (serial.SerialException, OSError) as e:
+                    # Keep reading the other ports
+                    print("Stop reading source {}: {}".format(ser.source, e))
+                    self._selector.unregister(key.fileobj)
+
+    def stop(self):
+        self.event_stop.set()
+        if self.is_alive():
+            self.join()
+        for ser in self._scheduled:
+            if ser.log is not None:
+                ser.log.stop()
+        for ser in self._own_thread:
+            ser.stop()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Tests of the Telegram bot, run against botstub.StubBot. Run with
+#   python -m unittest test_adsl
+
+import threading
+import time
+import unittest
+
+import adsl
+import botstub
+import config
+import serialrx
+import simulator
+
+CHAT_ID = "42"
+
+
+class OutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self._delays = adsl.Outbox.COALESCE_DELAY, adsl.Outbox.MIN_INTERVAL
+        adsl.Outbox.COALESCE_DELAY = 0.2
+        adsl.Outbox.MIN_INTERVAL = 0.1
+
+        self.bot = botstub.StubBot(chat_id=CHAT_ID)
+        self.outbox = adsl.Outbox(self.bot, CHAT_ID)
+
+    def tearDown(self):
+        adsl.Outbox.COALESCE_DELAY, adsl.Outbox.MIN_INTERVAL = self._delays
+
+    def start(self):
+        threading.Thread(target=self.outbox.run, daemon=True).start()
+
+    def test_coalesce(self):
+        self.outbox.put("alarm 1", coalesce=True)
+        self.outbox.put("reply")
+        self.outbox.put("alarm 2", coalesce=True)
+        self.start()
+
+        self.assertTrue(self.bot.wait_sent(2, timeout=5))
+        time.sleep(0.5)
+        texts = [text for _, text, _ in self.bot.sent]
+        self.assertEqual(texts, ["reply", "alarm 1\n\nalarm 2"])
+
+    def test_rate_limit(self):
+        for i in range(3):
+            self.outbox.put("message {}".format(i))
+        self.start()
+
+        self.assertTrue(self.bot.wait_sent(3, timeout=5))
+        times = [t for _, _, t in self.bot.sent]
+        for before, after in zip(times, times[1:]):
+            self.assertGreaterEqual(after - before, adsl.Outbox.MIN_INTERVAL * 0.9)
+
+    def test_split_long_burst(self):
+        alarms = ["alarm {} ".format(i) + "x" * 200 for i in range(100)]
+        for alarm in alarms:
+            self.outbox.put(alarm, coalesce=True)
+        self.start()
+
+        self.assertTrue(self.bot.wait_sent(2, timeout=10))
+        time.sleep(1)
+        texts = [text for _, text, _ in self.bot.sent]
+        self.assertTrue(all(len(text) <= adsl.MAX_MESSAGE_LENGTH for text in texts))
+        self.assertEqual("\n\n".join(texts).split("\n\n"), alarms)
+
+    def test_messages(self):
+        # Shared with the asyncio server
+        messages = adsl.Outbox.messages("alarm 1", [("reply", False), ("alarm 2", True)])
+        self.assertEqual(messages, ["reply", "alarm 1\n\nalarm 2"])
+
+    def test_split_long_text(self):
+        text = "\n".join("line {}".format(i) * 10 for i in range(1000))
+        messages = adsl.split_messages([text])
+        self.assertTrue(all(len(message) <= adsl.MAX_MESSAGE_LENGTH for message in messages))
+        self.assertEqual("\n".join(messages), text)
+
+
+class ADSLTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._config = config.TELEGRAM_GROUP
+        config.TELEGRAM_GROUP = CHAT_ID
+
+    @classmethod
+    def tearDownClass(cls):
+        config.TELEGRAM_GROUP = cls._config
+
+    def setUp(self):
+        self._delays = adsl.Outbox.COALESCE_DELAY, adsl.Outbox.MIN_INTERVAL
+        adsl.Outbox.COALESCE_DELAY = 0.2
+        adsl.Outbox.MIN_INTERVAL = 0
+
+        self.ser = serialrx.SerialRX(simulator.SimulatedSerial([]), log_dir='')
+        self.bot = botstub.StubBot(chat_id=CHAT_ID)
+        self.adsl = adsl.ADSL({"default": self.ser}, self.bot)
+        self.adsl.daemon = True
+        self.adsl.start()
+        # Hello message
+        self.assertTrue(self.bot.wait_sent(1, timeout=5))
+
+    def tearDown(self):
+        adsl.Outbox.COALESCE_DELAY, adsl.Outbox.MIN_INTERVAL = self._delays
+
+    def ingest(self, *lines):
+        self.ser._process_lines([line + "\n" for line in lines])
+        time.sleep(0.2)
+
+    def last_sent(self, count):
+        self.assertTrue(self.bot.wait_sent(count, timeout=5), self.bot.sent)
+        return self.bot.sent[count - 1][1]
+
+    def test_status(self):
+        self.ingest("[1] FSM: FSM_OISIF", "[2] FSM: FSM_QSO")
+        self.bot.command("/status")
+        text = self.last_sent(2)
+        self.assertIn("Current state: FSM_QSO", text)
+        self.assertIn("FSM_OISIF: entered 1 times", text)
+
+    def test_stats(self):
+        self.ingest("[1] TEMP 21.5")
+        self.bot.command("/stats")
+        text = self.last_sent(2)
+        self.assertTrue(text.startswith("Stats:"))
+        self.assertIn("temp: 21.5 since", text)
+
+    def test_alarms_coalesced(self):
+        self.ingest("common init", "[1] [HOHO] broken")
+        text = self.last_sent(2)
+        self.assertIn("A reset occured", text)
+        self.assertIn("[1] [HOHO] broken", text)
+
+    def wait_text(self, text, count, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if sum(t.count(text) for _, t, _ in self.bot.sent) >= count:
+                return
+            time.sleep(0.05)
+        self.fail("{!r} not sent {} times in {}".format(text, count, self.bot.sent))
+
+    def test_two_resets(self):
+        self.ingest("common init")
+        self.wait_text("Sorry to bother you", 1)
+        # The auto-acked alarm is cleared by the following check
+        self.wait_text("Problem fixed", 1)
+
+        self.ingest("[1] FSM: FSM_OISIF", "common init")
+        self.wait_text("Sorry to bother you", 2)
+        self.wait_text("Problem fixed", 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Tests of history.History against a plain list of the entries. Run with
+#   python -m unittest test_history
+
+import bisect
+import random
+import unittest
+
+from history import History
+
+
+class SmallHistory(History):
+    # Small sizes, so that a few hundred lines seal, decode, compact and
+    # split the reads into several chunks
+    COMPACT_MIN = 8
+    CHUNK_SIZE = 7
+    BLOCK_SIZE = 16
+    DECODED_BLOCKS = 2
+
+
+class Model:
+    """Every entry ever appended, the live ones being those from the
+    first_seq of the History under test"""
+
+    def __init__(self, first_seq):
+        self.base = first_seq
+        self.ts = []
+        self.lines = []
+
+    def extend(self, entries):
+        for ts, line in entries:
+            self.ts.append(ts)
+            self.lines.append(line)
+
+    @property
+    def next_seq(self):
+        return self.base + len(self.ts)
+
+    def entries(self, start_seq, end_seq):
+        start = start_seq - self.base
+        end = end_seq - self.base
+        return list(zip(self.ts[start:end], self.lines[start:end]))
+
+    def seq_at(self, ts, first_seq):
+        start = first_seq - self.base
+        return self.base + bisect.bisect_left(self.ts, ts, start)
+
+
+class HistoryModelTest(unittest.TestCase):
+
+    def run_model(self, seed, max_age, first_seq=0, max_bytes=None, hot_lines=None, steps=300):
+        rnd = random.Random(seed)
+        history = SmallHistory(max_age, first_seq, max_bytes, hot_lines)
+        model = Model(first_seq)
+        now = 1000.0
+
+        for step in range(steps):
+            entries = []
+            for _ in range(rnd.choice((0, 1, 1, 3, 10, 40))):
+                # Several lines often share a timestamp
+                now += rnd.choice((0, 0, 0.01, 0.5, 2))
+                entries.append((now, "[{}] line {}".format(step, "x" * rnd.randrange(60))))
+            history.extend(entries)
+            model.extend(entries)
+            if max_bytes is not None:
+                self.assertLessEqual(history.memory(), max_bytes)
+
+            if rnd.random() < 0.3:
+                history.expire(now)
+                cutoff = model.seq_at(now - max_age, history.first_seq)
+                if max_bytes is None:
+                    # Nothing recent is dropped, and at most the rest of a
+                    # block of older entries is left
+                    self.assertLessEqual(history.first_seq, cutoff)
+                    slack = 0 if hot_lines is None else SmallHistory.BLOCK_SIZE
+                    self.assertLessEqual(cutoff - history.first_seq, max(slack - 1, 0))
+
+            self.check(history, model, rnd, now)
+
+    def check(self, history, model, rnd, now):
+        first_seq = history.first_seq
+        next_seq = history.next_seq
+        self.assertEqual(next_seq, model.next_seq)
+        self.assertGreaterEqual(first_seq, model.base)
+        self.assertEqual(len(history), next_seq - first_seq)
+
+        live = model.entries(first_seq, next_seq)
+        self.assertEqual(list(history), live)
+        self.assertEqual(history.oldest(), live[0][0] if live else None)
+
+        for _ in range(5):
+            since = rnd.choice((None, now - rnd.uniform(0, 200)))
+            until = rnd.choice((None, now - rnd.uniform(-1, 100)))
+            last = rnd.choice((None, 0, 1, 5, 50))
+            if since is not None:
+                self.assertEqual(history.seq_at(since), model.seq_at(since, first_seq))
+
+            expected = [e for e in live if (since is None or e[0] >= since) and (until is None or e[0] < until)]
+            if last is not None:
+                expected = expected[max(len(expected) - last, 0):]
+            self.assertEqual(list(history.iter_range(since, until, last)), expected, (since, until, last))
+
+        for _ in range(5):
+            start = rnd.randrange(model.base, next_seq + 2)
+            end = rnd.choice((None, rnd.randrange(start, next_seq + 2)))
+            chunks = list(history.iter_chunks(start, end))
+            seq = max(start, first_seq)
+            entries = []
+            for chunk_seq, chunk in chunks:
+                self.assertEqual(chunk_seq, seq)
+                self.assertTrue(0 < len(chunk) <= SmallHistory.CHUNK_SIZE, (start, end, first_seq, len(chunk)))
+                seq += len(chunk)
+                entries.extend(chunk)
+            end_seq = next_seq if end is None else min(end, next_seq)
+            self.assertEqual(entries, model.entries(max(start, first_seq), end_seq), (start, end, first_seq))
+
+    def test_plain(self):
+        for seed in range(3):
+            self.run_model(seed, max_age=60)
+
+    def test_first_seq(self):
+        self.run_model(1, max_age=60, first_seq=12345)
+
+    def test_sealed(self):
+        for seed in range(3):
+            self.run_model(seed, max_age=60, hot_lines=20)
+
+    def test_sealed_no_hot_lines(self):
+        self.run_model(4, max_age=30, hot_lines=0)
+
+    def test_max_bytes(self):
+        for seed in range(3):
+            self.run_model(seed, max_age=600, max_bytes=20000)
+
+    def test_sealed_max_bytes(self):
+        for seed in range(3):
+            self.run_model(seed, max_age=600, max_bytes=20000, hot_lines=20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import array
+import bisect
+import math
+import threading
+
+
+class Series:
+    """Fixed-capacity ring of samples, each one a timestamp and one or more
+    values. Every column is stored in its own array."""
+
+    def __init__(self, capacity, columns=1):
+        self.capacity = capacity
+        self.ts = array.array('d', [0.0]) * capacity
+        self.columns = [array.array('d', [0.0]) * capacity for _ in range(columns)]
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, ts, *values):
+        i = (self._start + self._count) % self.capacity
+        self.ts[i] = ts
+        for column, value in zip(self.columns, values):
+            column[i] = value
+
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def last_index(self):
+        if self._count == 0:
+            return None
+        return (self._start + self._count - 1) % self.capacity
+
+    def _ordered(self, data):
+        end = self._start + self._count
+        if end <= self.capacity:
+            return data[self._start:end]
+        return data[self._start:] + data[:end - self.capacity]
+
+    def range(self, since=None):
+        """Return the list of timestamps since the given time, and the list of
+        the values of each column"""
+        timestamps = self._ordered(self.ts)
+        start = 0 if since is None else bisect.bisect_left(timestamps, since)
+        return timestamps[start:].tolist(), [self._ordered(c)[start:].tolist() for c in self.columns]
+
+
+class Rollup:
+    """Min, max and mean of the samples over intervals of `resolution`
+    seconds, updated on every sample. Only the last `capacity` intervals
+    are kept."""
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        # Columns are min, max, sum and count
+        self._series = Series(capacity, 4)
+
+    def add(self, ts, value):
+        bucket = math.floor(ts / self.resolution) * self.resolution
+        i = self._series.last_index()
+
+        if i is None or bucket > self._series.ts[i]:
+            self._series.append(bucket, value, value, value, 1)
+        elif bucket == self._series.ts[i]:
+            mins, maxs, sums, counts = self._series.columns
+            if value < mins[i]:
+                mins[i] = value
+            if value > maxs[i]:
+                maxs[i] = value
+            sums[i] += value
+            counts[i] += 1
+        # Samples older than the current interval are ignored
+
+    def range(self, since=None):
+        timestamps, (mins, maxs, sums, counts) = self._series.range(since)
+        means = [s / n for s, n in zip(sums, counts)]
+        return timestamps, mins, maxs, means
+
+
+class MetricStore:
+    """Time series of the numeric telemetry values, with their raw samples
+    and 1-minute and 1-hour rollups"""
+
+    RESOLUTIONS = {"1m": 60, "1h": 3600}
+
+    def __init__(self, raw_capacity, minute_capacity, hour_capacity):
+        self._lock = threading.Lock()
+        self._capacities = {"raw": raw_capacity, "1m": minute_capacity, "1h": hour_capacity}
+        self._metrics = {}
+
+    def metrics(self):
+        return list(self._metrics)
+
+    def add(self, name, ts, value):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = {"raw": Series(self._capacities["raw"])}
+                for res, seconds in self.RESOLUTIONS.items():
+                    metric[res] = Rollup(seconds, self._capacities[res])
+                self._metrics[name] = metric
+
+            metric["raw"].append(ts, value)
+            for res in self.RESOLUTIONS:
+                metric[res].add(ts, value)
+
+    def get(self, name, res="raw", since=None):
+        """Return the series as a dict of columns, or None if there is no
+        such metric or resolution"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None or res not in metric:
+                return None
+
+            if res == "raw":
+                timestamps, (values,) = metric[res].range(since)
+                return {"t": timestamps, "v": values}
+
+            timestamps, mins, maxs, means = metric[res].range(since)
+            return {"t": timestamps, "min": mins, "max": maxs, "mean": means}
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Matthias P. Braendli, Maximilien Cuony
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# Formats shared by the web servers (glutte_serial_web.py on gevent and
+# glutte_serial_aio.py on asyncio)
+
+import collections
+import datetime
+import json
+import time
+import zlib
+
+HISTORY_CHUNK_SIZE = 64 * 1024
+# Longest wait=N of /stats, in seconds
+STATS_MAX_WAIT = 60
+
+def parse_time(value):
+    """Parse a timestamp given either as seconds since the epoch or as an ISO
+    8601 date (UTC unless it carries an offset), raise ValueError if it is
+    neither"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    ts = datetime.datetime.fromisoformat(value)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    return ts.timestamp()
+
+def history_entries(ser, since, until, last, line_filter):
+    """The (ts, line) entries of /history, raise ValueError if last is
+    negative"""
+    if last is not None and last < 0:
+        raise ValueError("last must not be negative")
+
+    if line_filter is None:
+        return ser.iter_history(since, until, last)
+
+    entries = (e for e in ser.iter_history(since, until) if line_filter.match(e[1]))
+    if last is not None:
+        # The last matching lines can be anywhere in the range
+        entries = collections.deque(entries, maxlen=last)
+    return entries
+
+def poll_stats(parser, etag_matches, wait):
+    """Long-poll of /stats: while the client has the current body
+    (etag_matches(etag)) and the wait is not over, yields (etag, body,
+    version, timeout), the caller then waits up to timeout for the values to
+    change from version. The last item has a timeout of None and is the
+    answer."""
+    deadline = time.time() + min(wait, STATS_MAX_WAIT)
+    while True:
+        version = parser.version
+        etag, body, expiry = parser.stats()
+        if not etag_matches(etag) or time.time() >= deadline:
+            yield etag, body, version, None
+            return
+        yield etag, body, version, max(0, min(deadline, expiry) - time.time())
+
+def format_history(entries):
+    chunk = []
+    size = 0
+    for ts, line in entries:
+        text = f"{datetime.datetime.utcfromtimestamp(ts).isoformat()} {line}\n"
+        chunk.append(text)
+        size += len(text)
+        if size >= HISTORY_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield "".join(chunk)
+
+def format_search(cache, seqs, context):
+    # Merge the overlapping context windows around the matches
+    windows = []
+    for seq in seqs:
+        if windows and seq - context <= windows[-1][1]:
+            windows[-1][1] = seq + context + 1
+        else:
+            windows.append([max(0, seq - context), seq + context + 1])
+
+    for i, (start, end) in enumerate(windows):
+        if i > 0 and context:
+            yield "--\n"
+        yield from format_history(e for _, chunk in cache.iter_chunks(start, end) for e in chunk)
+
+def encoding_quality(header, encoding):
+    """Quality value given to the encoding by an Accept-Encoding header, like
+    request.accept_encodings[encoding] in Flask: the entry for the encoding
+    wins over "*", and 0 means not acceptable"""
+    quality = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        q = 1
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = min(max(float(value), 0), 1)
+                except ValueError:
+                    pass
+        quality[name] = max(q, quality.get(name, 0))
+    return quality.get(encoding, quality.get("*", 0))
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+class StreamCompressor:
+    """Compress the frames of one /stream connection with raw deflate,
+    keeping the context across frames like permessage-deflate does. Every
+    frame ends with a sync flush whose 00 00 ff ff trailer is removed, the
+    client has to add it back before inflating."""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def compress(self, text):
+        data = self._compressor.compress(text.encode()) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-4]
+
+def stream_frame(lines, epoch, next_seq, lost, with_seq, compressor):
+    """Build a /stream frame, text or bytes if compressed"""
+    data = "".join(lines)
+    if with_seq:
+        data = json.dumps({"epoch": epoch, "next": next_seq, "lost": lost, "data": data})
+        if compressor is not None:
+            # The client gets a continuous stream, separate the objects
+            data += "\n"
+    if compressor is not None:
+        data = compressor.compress(data)
+    return data
+
+def replay(cache, from_seq, end_seq, line_filter):
+    """Iterate over the (lines, next_seq, lost) to send to resume a /stream
+    from from_seq up to end_seq"""
+    expected = from_seq
+    for seq, entries in cache.iter_chunks(from_seq, end_seq):
+        lines = [line + "\n" for _, line in entries]
+        if line_filter is not None:
+            lines = [line for line in lines if line_filter.match(line)]
+        # The history may not go back to from_seq anymore
+        lost = max(0, seq - expected)
+        if lines or lost:
+            yield lines, seq + len(entries), lost
+        expected = seq + len(entries)